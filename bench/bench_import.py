@@ -0,0 +1,57 @@
+'''
+Times the serial import of a save against the multi-process one and checks that both give the same systems.
+
+usage: python bench/bench_import.py path/to/campaign.xml [--workers 2 4 8] [--streaming] [--repeat 3]
+'''
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import sectordex_lib as lib
+
+
+def get_sector_summary(sector):
+    # everything that ends up in the system details, in the order the systems were loaded
+    summary = []
+    for system in sector.systems:
+        planets = [(planet.id, repr(planet), [cond.id for cond in planet.resources + planet.conditions]) for planet in system.planets]
+        summary.append((system.id, repr(system), system.loc, system.themes, repr(system.stars), planets,
+                        repr(system.stations), repr(system.stable_locs), system.salvageables_dict, system.num_jump_points))
+    return summary
+
+def time_import(path, workers, streaming, repeat):
+    best_time = None
+    for _ in range(repeat):
+        sector = lib.Sector()
+        start = perf_counter()
+        sector.load_from_xml(path, streaming=streaming, workers=workers)
+        elapsed = perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, get_sector_summary(sector)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare serial and multi-process save import times.')
+    parser.add_argument('path', help='path to a campaign.xml inside of a Starsector install')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument('--streaming', action='store_true', help='use the streaming loader for every run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per worker count, the best one is reported')
+    args = parser.parse_args()
+
+    # load the game/mod data up front so it doesn't count towards the first run
+    lib.load_catalogs(lib.get_starsector_dir(args.path))
+
+    serial_time, serial_summary = time_import(args.path, 1, args.streaming, args.repeat)
+    results = [(1, serial_time, True)]
+    for workers in sorted(set(args.workers) - {1}):
+        parallel_time, parallel_summary = time_import(args.path, workers, args.streaming, args.repeat)
+        results.append((workers, parallel_time, parallel_summary == serial_summary))
+
+    print(f'\n{len(serial_summary)} systems, {os.cpu_count()} cpus, streaming={args.streaming}')
+    print('workers   time (s)   speedup   same result')
+    for workers, elapsed, is_same in results:
+        print(f'{workers:>7}   {elapsed:>8.2f}   {serial_time/elapsed:>6.2f}x   {is_same}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Times serial searches of a save against parallel ones on a QueryPool and checks that both give the same systems.
+
+usage: python bench/bench_query.py path/to/campaign.xml [--workers 2 4 8] [--repeat 5]
+'''
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import sectordex_lib as lib
+
+
+def get_requirements(sector):
+    # a cheap search, one with a few planet reqs and an expression
+    lowest_levels = [levels[0] for levels in lib.RESOURCE_LEVEL_LISTS]
+    max_hazard = sector.get_hazard_range()[1]
+    return {
+        'uninhabited': lib.StarSystemReq(must_be_uninhabited=True),
+        'planet reqs': lib.StarSystemReq(planet_reqs=[lib.PlanetReq(desired_resources=[level], desired_hazard=max_hazard) for level in lowest_levels[:4]]),
+        'expression': lib.ExpressionReq('(ore >= abundant or rare_ore >= rich) and not pollution and planet(farmland or organics >= abundant)')
+    }
+
+def time_search(sector, system_requirement, workers, repeat):
+    best_time = None
+    for _ in range(repeat):
+        start = perf_counter()
+        matching_systems = sector.get_matching_systems(system_requirement, workers=workers)
+        elapsed = perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, matching_systems
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare serial and parallel search times.')
+    parser.add_argument('path', help='path to a campaign.xml inside of a Starsector install')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=5, help='runs per search and worker count, the best one is reported')
+    args = parser.parse_args()
+
+    sector = lib.Sector()
+    sector.load_from_xml(args.path, streaming=True, use_snapshot=True)
+    # parallel searches only kick in above the threshold, which is what's being measured here
+    lib.PARALLEL_QUERY_MIN_SYSTEMS = 0
+
+    print(f'\n{len(sector.systems)} systems, {os.cpu_count()} cpus')
+    print('search         workers   time (ms)   speedup   same result')
+    for name, system_requirement in get_requirements(sector).items():
+        serial_time, serial_systems = time_search(sector, system_requirement, 1, args.repeat)
+        print(f'{name:<12}   {1:>7}   {serial_time*1000:>9.1f}   {1:>6.2f}x   True')
+        for workers in sorted(set(args.workers) - {1}):
+            # the first search starts the pool, which isn't part of the timing
+            sector.get_matching_systems(system_requirement, workers=workers)
+            parallel_time, parallel_systems = time_search(sector, system_requirement, workers, args.repeat)
+            print(f'{name:<12}   {workers:>7}   {parallel_time*1000:>9.1f}   {serial_time/parallel_time:>6.2f}x   {parallel_systems == serial_systems}')
+    sector.close_query_pool()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 import PySimpleGUI as sg
 import sectordex_lib as lib
-from time import sleep
+import threading
 import starmapdrawer
 
 sg.theme_background_color(color='#2c2f33') # non-element bg color
@@ -23,11 +23,39 @@ sg.theme_slider_border_width(border_width=0) # does nothing?
 # Secondary windows
 def get_import_progress_window():
     layout = [
-        [sg.Frame('Status', [[sg.Output(size=(40,9), echo_stdout_stderr=True)]], border_width=0)]
-        #[sg.ProgressBar(10, 'h', (28, 20), k='import_progress_bar')]
+        [sg.T('Starting import', size=(40, 1), k='import_phase_text')],
+        [sg.ProgressBar(1000, 'h', (28, 20), k='import_progress_bar')],
+        [sg.T('', size=(40, 1), k='import_detail_text')],
+        [sg.Button('Cancel', k='cancel_import_button')]
     ]
     return sg.Window('Import in progress', layout, finalize=True)
 
+def run_import(main_win, path, progress, previous_sector=None):
+    # runs on its own thread so that the windows keep redrawing during the import
+    # systems which haven't changed since the previous import (e.g. an older save of the same campaign) get reused
+    # the outcome gets posted back to the event loop as an event
+    try:
+        new_sector = lib.Sector()
+        new_sector.load_from_xml(path, use_snapshot=True, progress=progress, previous_sector=previous_sector, fingerprint_systems=True)
+        main_win.write_event_value('import_done', new_sector)
+    except lib.ImportCancelled:
+        main_win.write_event_value('import_cancelled', None)
+    except OSError:
+        main_win.write_event_value('import_failed', 'Invalid path')
+    except Exception as e:
+        main_win.write_event_value('import_failed', f'Import failed: {e}')
+
+def update_import_progress_window(import_progress_win, progress_event):
+    import_progress_win['import_phase_text'].update(value=progress_event.phase.capitalize())
+    detail_str = ''
+    if progress_event.systems_total:
+        detail_str += f'{progress_event.systems_done} out of {progress_event.systems_total} systems  '
+    if progress_event.bytes_total:
+        detail_str += f'{progress_event.bytes_read/1e6:0.1f} out of {progress_event.bytes_total/1e6:0.1f}MB read'
+    import_progress_win['import_detail_text'].update(value=detail_str)
+    if (fraction := progress_event.get_fraction()) is not None:
+        import_progress_win['import_progress_bar'].update(current_count=int(1000*fraction))
+
 def get_starmap_window(graph_bottom_left, graph_top_right):
     starmap = sg.Graph(
         canvas_size=(800, 800), 
@@ -72,7 +100,7 @@ save_import_frame_data = [
     [sg.Input(size=(133, 5), k='path_input'), sg.FileBrowse(), sg.Button('Import selected', k='import_selected_button')]
     #[sg.Input(size=(146, 5), k='import_selected_button_path', readonly=True, enable_events=True), sg.FileBrowse(button_text='Import save')]
 ]
-save_import_frame = sg.Frame('Import save (campaign.xml file)', save_import_frame_data, border_width=0)
+save_import_frame = sg.Frame('Import save (campaign.xml file, compressed campaign.xml or zipped save folder)', save_import_frame_data, border_width=0)
 
 '''
 ======================================================== System requirements panel ========================================================
@@ -80,10 +108,12 @@ save_import_frame = sg.Frame('Import save (campaign.xml file)', save_import_fram
 # MINIMUM PLANET NUMBER AND MAXIMUM SYSTEM DISTANCE SLIDERS
 
 system_req_frame_data = [
-    [sg.Check('Uninhabited systems only', pad=(10, 12), disabled=True, k='uninhabited_systems_checkbox')],
+    [sg.Check('Uninhabited systems only', pad=(10, 12), disabled=True, k='uninhabited_systems_checkbox'), sg.Check('Different planet for each planet req', pad=(10, 12), disabled=True, k='distinct_planets_checkbox')],
     [sg.T('Desired system theme:                    ', pad=(10, 5)), sg.Combo(values=[], default_value=None, size=(40, 5), k='theme_dropdown', readonly=True, disabled=True, pad=(10, 5))],
-    [sg.T('Min number of planets:                     ', pad=(10, 0)), sg.Slider(range=(0,0),default_value=0,orientation='horizontal',size=(33, 12), border_width=0, k='min_planet_num_slider', pad=(10, 0))],
-    [sg.T('Max distance from map center in ly:  ', pad=(10, 0)), sg.Slider(range=(0,0),default_value=0,orientation='horizontal',size=(33, 12), resolution=5, border_width=0, k='max_dist_slider', pad=(10, 0))],
+    [sg.T('Min number of planets:                     ', pad=(10, 0)), sg.Slider(range=(0,0),default_value=0,orientation='horizontal',size=(33, 12), border_width=0, k='min_planet_num_slider', pad=(10, 0), enable_events=True)],
+    [sg.T('Max distance from map center in ly:  ', pad=(10, 0)), sg.Slider(range=(0,0),default_value=0,orientation='horizontal',size=(33, 12), resolution=5, border_width=0, k='max_dist_slider', pad=(10, 0), enable_events=True)],
+    [sg.T('Near inhabited system or player fleet:', pad=(10, 5)), sg.Combo(values=[], default_value=None, size=(40, 5), k='near_dropdown', readonly=True, disabled=True, pad=(10, 5))],
+    [sg.T('Max distance from it in ly:                ', pad=(10, 0)), sg.Slider(range=(0,0),default_value=0,orientation='horizontal',size=(33, 12), border_width=0, k='near_radius_slider', pad=(10, 0), enable_events=True)],
     [sg.T('', pad=(0, 0))]
     
 ]
@@ -179,10 +209,12 @@ planet_req_frame = sg.Frame('System planet requirements', planet_req_frame_data,
 ======================================================== Search results panel ========================================================
 '''
 system_list_frame_text = 'Search results'
+# number of systems listed when only the best colony sites are shown
+TOP_SYSTEM_NUM = 20
 # FOUND SYSTEMS LIST
 system_list_frame_data = [
     [sg.Listbox(values=[], size=(70,11), enable_events=True, k='systems_listbox', right_click_menu=['', ['Show on sector map']])],
-    [sg.Button('Save system info', k='save_system_info_button'), sg.Button('Show on map', k='show_on_map_button')]
+    [sg.Check(f'Only the best {TOP_SYSTEM_NUM} colony sites', k='top_systems_checkbox', enable_events=True), sg.Button('Save system info', k='save_system_info_button'), sg.Button('Show on map', k='show_on_map_button')]
 ]
 system_list_frame = sg.Frame('Search results', system_list_frame_data, element_justification='right', k='system_list_frame', border_width=1)
 
@@ -211,12 +243,15 @@ layout = [
 main_win = sg.Window('Sectordex', layout, finalize=True)
 disable_planet_req_ui(main_win, disable=True)
 import_progress_win = None
+import_progress = None
 starmap_win = None
 
 '''
 ============================================================= Global vars ============================================================
 '''
 sector = lib.Sector()
+# option of the near dropdown for searching around the player's fleet
+PLAYER_FLEET_LABEL = 'Player fleet'
 drag_start_x, drag_start_y = 0, 0
 drag_offset_x, drag_offset_y = 0, 0
 is_dragging = False
@@ -301,11 +336,41 @@ def update_req_list_from_ui(main_win, values):
             desired_resources=new_resources, 
             desired_hazard=new_hazard,
             exclusive_type_mode=values['exclusive_types_checkbox'],
-            exclusive_cond_mode=values['exclusive_cond_checkbox']
+            exclusive_cond_mode=values['exclusive_cond_checkbox'],
+            max_hazard=sector.get_hazard_range()[1]
         )
         updated_req_list = req_list[:selected_req_index] + [new_planet_req] + req_list[selected_req_index+1:]
         main_win['planet_req_listbox'].update(values=updated_req_list, set_to_index=updated_req_list.index(new_planet_req))
 
+def get_near_loc(near_value):
+    if near_value == PLAYER_FLEET_LABEL:
+        return sector.player_loc
+    if near_value and (near_system := sector.get_system_by_name(near_value)) is not None:
+        return near_system.loc
+    return None
+
+def search_systems(main_win, values):
+    system_requirement = lib.StarSystemReq(
+        max_distance=values['max_dist_slider'], 
+        min_planet_num=values['min_planet_num_slider'], 
+        planet_reqs=main_win['planet_req_listbox'].get_list_values(),
+        desired_theme=values['theme_dropdown'],
+        must_be_uninhabited=values['uninhabited_systems_checkbox'],
+        distinct_planets=values['distinct_planets_checkbox'],
+        near_loc=get_near_loc(values['near_dropdown']),
+        near_radius=values['near_radius_slider']
+    )
+    if values['top_systems_checkbox']:
+        # ranked by colony score, best first
+        top_systems = sector.get_top_systems(system_requirement, TOP_SYSTEM_NUM, vectorized=True, indexed=True, cached=True)
+        main_win['system_list_frame'].update(value=f'{system_list_frame_text} (best {len(top_systems)})')
+        main_win['systems_listbox'].update(values=[system for system, _ in top_systems])
+    else:
+        matching_systems = sector.get_matching_systems(system_requirement, vectorized=True, indexed=True, cached=True)
+        main_win['system_list_frame'].update(value=f'{system_list_frame_text} ({len(matching_systems)})')
+        main_win['systems_listbox'].update(values=sorted(matching_systems, key=lambda system: system.dist))
+    main_win['system_details_text'].update(value='')
+
 req_update_keys = [
     'planet_types_listbox',
     'ore_dropdown',
@@ -469,9 +534,12 @@ def get_detail_string(sys):
 
 while True:
     win, event, values = sg.read_all_windows()
-    if event == sg.WIN_CLOSED:
+    if event == sg.WIN_CLOSED or event == 'cancel_import_button':
         if win is import_progress_win:
-            pass
+            # the window gets closed once the import thread reports back
+            import_progress.cancel()
+            if event == 'cancel_import_button':
+                import_progress_win['import_phase_text'].update(value='Cancelling')
         elif win is not main_win:
             win.close()
         else:
@@ -490,7 +558,8 @@ while True:
             starmap_win = get_starmap_window(canvas_lower_left, canvas_top_right)
             starmapdrawer.draw_polar_axes(starmap_win['starmap_graph'], radius=sector.max_system_dist, canvas_size=canvas_size)
             starmapdrawer.draw_stars(starmap_win['starmap_graph'], sector.systems, canvas_size)
-            starmapdrawer.draw_labels(starmap_win['starmap_graph'], sector.systems, selected_system, canvas_size)
+            nearby_systems = sector.get_systems_near(selected_system.loc, starmapdrawer.NEIGHBORHOOD_RADIUS)
+            starmapdrawer.draw_labels(starmap_win['starmap_graph'], sector.systems, selected_system, canvas_size, nearby_systems)
 
     elif event == 'close_starmap_button':
         starmap_win.close()
@@ -498,9 +567,24 @@ while True:
     # importing save file handler
     elif event == 'import_selected_button':
         path = main_win['path_input'].get()
+        main_win['import_selected_button'].update(disabled=True)
         import_progress_win = get_import_progress_window()
-        try:
-            sector.load_from_xml(path)
+        import_progress = lib.ImportProgress(callback=lambda progress_event: main_win.write_event_value('import_progress', progress_event))
+        previous_sector = sector if sector.systems else None
+        threading.Thread(target=run_import, args=(main_win, path, import_progress, previous_sector), daemon=True).start()
+
+    elif event == 'import_progress':
+        if import_progress_win is not None:
+            update_import_progress_window(import_progress_win, values['import_progress'])
+
+    elif event in ('import_done', 'import_cancelled', 'import_failed'):
+        import_progress_win.close()
+        import_progress_win = None
+        main_win['import_selected_button'].update(disabled=False)
+        if event == 'import_failed':
+            sg.popup(values['import_failed'])
+        elif event == 'import_done':
+            sector = values['import_done']
             # enabling so that the list gets visually updated, then disabling after
             main_win['planet_types_listbox'].update(values=sorted(list(sector.planet_types)), disabled=False)
             main_win['planet_types_listbox'].update(disabled=True)
@@ -512,19 +596,20 @@ while True:
             main_win['min_planet_num_slider'].update(value=0)
             main_win['theme_dropdown'].update(values=[None] + sorted(list(sector.all_themes)), set_to_index=0, disabled=False, readonly=True)
             main_win['uninhabited_systems_checkbox'].update(disabled=False)
+            main_win['distinct_planets_checkbox'].update(disabled=False)
+            near_values = [None] + ([PLAYER_FLEET_LABEL] if sector.player_loc is not None else []) + sorted([system.name for system in sector.systems if system.is_inhabited])
+            main_win['near_dropdown'].update(values=near_values, set_to_index=0, disabled=False, readonly=True)
+            main_win['near_radius_slider'].update(range=(0, 2*sector.max_system_dist))
+            main_win['near_radius_slider'].update(value=10)
 
             main_win['hazard_slider'].update(range=[100*hazard for hazard in sector.get_hazard_range()])
             default_hazard = 100*sector.get_hazard_range()[1]
             main_win['hazard_slider'].update(value=default_hazard)
 
             print('Import complete')
-            sleep(0.5)
             main_win['add_planet_req_button'].update(disabled=False)
             main_win['remove_planet_req_button'].update(disabled=False)
             main_win['search_systems_button'].update(disabled=False)
-        except OSError:
-            sg.popup('Invalid path')
-        import_progress_win.close()
     
     elif event == 'planet_req_listbox':
         req_list = main_win['planet_req_listbox'].get_list_values()
@@ -563,7 +648,7 @@ while True:
 
     # pressing add new planet req handler
     elif event == 'add_planet_req_button':
-        new_req_list = main_win['planet_req_listbox'].get_list_values() + [lib.PlanetReq(desired_hazard=default_hazard/100)]
+        new_req_list = main_win['planet_req_listbox'].get_list_values() + [lib.PlanetReq(desired_hazard=default_hazard/100, max_hazard=sector.get_hazard_range()[1])]
         new_req_index = len(new_req_list)-1
         main_win['planet_req_listbox'].update(values=new_req_list, set_to_index=new_req_index, scroll_to_index=new_req_index)
         reset_planet_req_ui(main_win)
@@ -573,17 +658,12 @@ while True:
 
     # pressing search button handler
     elif event == 'search_systems_button':
-        system_requirement = lib.StarSystemReq(
-            max_distance=values['max_dist_slider'], 
-            min_planet_num=values['min_planet_num_slider'], 
-            planet_reqs=main_win['planet_req_listbox'].get_list_values(),
-            desired_theme=values['theme_dropdown'],
-            must_be_uninhabited=values['uninhabited_systems_checkbox']
-        )
-        matching_systems = sector.get_matching_systems(system_requirement)
-        main_win['system_list_frame'].update(value=f'{system_list_frame_text} ({len(matching_systems)})')
-        main_win['systems_listbox'].update(values=sorted(matching_systems, key=lambda system: system.dist))
-        main_win['system_details_text'].update(value='')
+        search_systems(main_win, values)
+
+    # searching is quick enough to redo the search whenever the system sliders move
+    elif event in ('max_dist_slider', 'min_planet_num_slider', 'near_radius_slider', 'top_systems_checkbox'):
+        if sector.systems:
+            search_systems(main_win, values)
 
     # selecting a system in the results handler
     elif event == 'systems_listbox':
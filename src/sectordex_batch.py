@@ -0,0 +1,63 @@
+'''
+Scans a folder of saves (e.g. new games with different seeds) for the best colony spots and ranks the seeds.
+
+usage: python sectordex_batch.py path/to/saves reqs.json [--workers 4] [--top 5] [--snapshots]
+
+reqs.json is a list of system requirements, e.g.
+[
+    {"name": "farming", "max_distance": 30, "uninhabited": true, "planets": [{"resources": ["farmland_rich"], "max_hazard": 125}]},
+    {"name": "near fleet", "near": "player_fleet", "near_radius": 8, "min_planets": 3},
+    {"name": "mining", "expression": "(ore >= abundant or rare_ore >= rich) and not pollution and uninhabited"}
+]
+keys: name, expression (on its own, see ExpressionReq in sectordex_lib.py), max_distance, min_planets, uninhabited, theme, faction, near (system name or player_fleet), near_radius, planets,
+distinct_planets (every planet requirement needs a planet of its own), markets
+planet keys: types, conditions, resources (minimum levels), max_hazard (in %), exclusive_types, exclusive_conditions
+market keys: faction (any faction if left out), min_size, min_distance, max_distance (in ly from the nearest market of the faction)
+'''
+import argparse
+import bisect
+import json
+import sectordex_lib as lib
+
+
+def print_save_result(result, rank, finished_num, save_num):
+    print(f'[{finished_num}/{save_num}] #{rank} so far: {result.seed} ({result.name}) score {result.get_rank_score():0.2f} - {result.path}')
+    if result.error is not None:
+        print(f'    could not scan: {result.error}')
+        return
+    for req_name, match_num, top_systems, req_error in result.req_results:
+        if req_error is not None:
+            print(f'    {req_name}: could not search: {req_error}')
+            continue
+        top_system_strs = [f'{system_name} ({system_score:0.2f})' for system_name, _, system_score in top_systems]
+        print(f'    {req_name}: {match_num} systems, best: {", ".join(top_system_strs) or "-"}')
+
+def print_ranking(results):
+    print('\nrank   score      seed                 name')
+    for rank, result in enumerate(results, start=1):
+        print(f'{rank:>4}   {result.get_rank_score():>8.2f}   {str(result.seed):<20} {result.name}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank the saves in a folder by their best colony spots.')
+    parser.add_argument('save_dir', help='folder with one folder (or zip archive) per save, like the saves folder of the game')
+    parser.add_argument('reqs_path', help='json file with a list of system requirements')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes the saves are loaded on, all cpus by default')
+    parser.add_argument('--top', type=int, default=5, help='number of systems listed per requirement')
+    parser.add_argument('--snapshots', action='store_true', help='use (and make) sector snapshots, for scanning the same saves again')
+    args = parser.parse_args()
+
+    with open(args.reqs_path) as reqs_file:
+        req_dicts = json.load(reqs_file)
+    save_paths = lib.get_save_paths(args.save_dir)
+    print(f'Scanning {len(save_paths)} saves for {len(req_dicts)} requirements')
+
+    # kept sorted best first as the results come in
+    ranked_results = []
+    for finished_num, result in enumerate(lib.scan_saves(save_paths, req_dicts, args.workers, args.top, args.snapshots), start=1):
+        rank = bisect.bisect_right([-ranked_result.get_rank_score() for ranked_result in ranked_results], -result.get_rank_score())
+        ranked_results.insert(rank, result)
+        print_save_result(result, rank+1, finished_num, len(save_paths))
+    print_ranking(ranked_results)
+
+if __name__ == '__main__':
+    main()
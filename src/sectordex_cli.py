@@ -0,0 +1,188 @@
+'''
+Searches a save from the command line and prints the matching systems with their planets as JSON Lines or CSV.
+
+usage: python sectordex_cli.py path/to/campaign.xml [--reqs reqs.json] [requirement flags] [--format jsonl|csv] [--top 20]
+
+requirements come from a json file (a list of requirements or a single one, same format as for sectordex_batch.py)
+or from the flags, e.g.
+python sectordex_cli.py campaign.xml --max-distance 30 --uninhabited --planet "types=terran,tundra max_hazard=150" --planet "resources=ore_abundant"
+planet flags are space separated key=value pairs (lists comma separated), exclusive_types/exclusive_conditions can be given without a value
+or from an expression (see ExpressionReq in sectordex_lib.py), e.g.
+python sectordex_cli.py campaign.xml --expr "(ore >= abundant or rare_ore >= rich) and not pollution and dist <= 30"
+
+the loaded save is kept as a snapshot (see the readme), so only the first search of a save has to wait for the import
+console output of the import goes to stderr, stdout only gets the results
+'''
+import argparse
+import csv
+import json
+import sys
+from contextlib import redirect_stdout
+from math import isfinite
+import sectordex_lib as lib
+
+
+PLANET_FLAG_LIST_KEYS = ('types', 'conditions', 'resources')
+PLANET_FLAG_BOOL_KEYS = ('exclusive_types', 'exclusive_conditions')
+CSV_COLUMNS = ('req', 'score', 'system_id', 'system_name', 'x', 'y', 'dist', 'themes', 'inhabited', 'stars', 'planet_num',
+               'planet_id', 'planet_name', 'planet_type', 'hazard', 'resources', 'conditions', 'faction', 'population_size')
+
+def get_planet_req_dict(planet_flag):
+    # "types=terran,tundra max_hazard=150 exclusive_types" -> planet req dict
+    planet_req_dict = {}
+    for pair in planet_flag.split():
+        key, _, value = pair.partition('=')
+        if key in PLANET_FLAG_BOOL_KEYS:
+            planet_req_dict[key] = value.lower() not in ('false', '0', 'no')
+        elif key in PLANET_FLAG_LIST_KEYS:
+            planet_req_dict[key] = [item for item in value.split(',') if item]
+        elif key == 'max_hazard':
+            planet_req_dict[key] = float(value)
+        else:
+            raise ValueError(f'Unknown planet requirement key: {key}')
+    return planet_req_dict
+
+def get_market_req_dict(market_flag):
+    # "faction=pirates min_distance=10" -> market req dict
+    market_req_dict = {}
+    for pair in market_flag.split():
+        key, _, value = pair.partition('=')
+        if key == 'faction':
+            market_req_dict[key] = value
+        elif key == 'min_size':
+            market_req_dict[key] = int(value)
+        elif key in ('min_distance', 'max_distance'):
+            market_req_dict[key] = float(value)
+        else:
+            raise ValueError(f'Unknown market requirement key: {key}')
+    return market_req_dict
+
+def get_req_dicts(args):
+    # from the --reqs file or --expr, or else from the flags
+    if args.reqs is not None:
+        with open(args.reqs) as reqs_file:
+            req_dicts = json.load(reqs_file)
+        if isinstance(req_dicts, dict):
+            req_dicts = [req_dicts]
+        return req_dicts
+    if args.expr is not None:
+        return [{'expression': args.expr}]
+    req_dict = {'planets': [get_planet_req_dict(planet_flag) for planet_flag in args.planet], 'uninhabited': args.uninhabited, 'distinct_planets': args.distinct_planets,
+                'markets': [get_market_req_dict(market_flag) for market_flag in args.market]}
+    for key in ('max_distance', 'min_planets', 'theme', 'faction', 'near', 'near_radius'):
+        if getattr(args, key) is not None:
+            req_dict[key] = getattr(args, key)
+    return [req_dict]
+
+def get_population_dict(population):
+    if population is None:
+        return None
+    return {'faction': population.faction_id, 'size': population.size}
+
+def get_planet_dict(planet):
+    return {
+        'id': planet.id,
+        'name': planet.name,
+        'type': planet.type.id,
+        'hazard': round(planet.hazard*100),
+        'resources': [cond.id for cond in planet.resources],
+        'conditions': [cond.id for cond in planet.conditions],
+        'population': get_population_dict(planet.population)
+    }
+
+def get_system_dict(system, req_name, score):
+    return {
+        'req': req_name,
+        'score': score,
+        'id': system.id,
+        'name': system.name,
+        'loc': [round(float(coord), 2) for coord in system.loc],
+        'dist': round(float(system.dist), 2),
+        'themes': list(system.themes),
+        'inhabited': system.is_inhabited,
+        'stars': [star.type.id for star in system.stars],
+        'planets': [get_planet_dict(planet) for planet in system.planets]
+    }
+
+def write_jsonl(out, system_dict):
+    # strict json, so a nan/inf that slips through fails here instead of in whatever reads the output
+    out.write(json.dumps(system_dict, allow_nan=False) + '\n')
+
+def write_csv_rows(csv_writer, system_dict):
+    # one row per planet, with the system columns repeated, or one row without planet columns if the system has no planets
+    system_row = {
+        'req': system_dict['req'], 'score': system_dict['score'], 'system_id': system_dict['id'], 'system_name': system_dict['name'],
+        'x': system_dict['loc'][0], 'y': system_dict['loc'][1], 'dist': system_dict['dist'], 'themes': ';'.join(system_dict['themes']),
+        'inhabited': system_dict['inhabited'], 'stars': ';'.join(system_dict['stars']), 'planet_num': len(system_dict['planets'])
+    }
+    if not system_dict['planets']:
+        csv_writer.writerow(system_row)
+    for planet_dict in system_dict['planets']:
+        population = planet_dict['population'] or {}
+        csv_writer.writerow({**system_row,
+            'planet_id': planet_dict['id'], 'planet_name': planet_dict['name'], 'planet_type': planet_dict['type'],
+            'hazard': planet_dict['hazard'], 'resources': ';'.join(planet_dict['resources']), 'conditions': ';'.join(planet_dict['conditions']),
+            'faction': population.get('faction'), 'population_size': population.get('size')
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description='Search a Starsector save for systems and print them as JSON Lines or CSV.')
+    parser.add_argument('path', help='path to a campaign.xml (or a compressed one / zipped save) inside of a Starsector install')
+    parser.add_argument('--reqs', help='json file with the requirements, instead of the flags below')
+    parser.add_argument('--expr', help='requirement expression, instead of the flags below')
+    parser.add_argument('--max-distance', type=float, help='max distance from the center in ly')
+    parser.add_argument('--min-planets', type=int, help='min number of planets')
+    parser.add_argument('--uninhabited', action='store_true', help='only uninhabited systems')
+    parser.add_argument('--theme', help='theme id, e.g. theme_ruins')
+    parser.add_argument('--faction', help='faction id which has to have a market or station in the system')
+    parser.add_argument('--near', help=f'system name or {lib.PLAYER_FLEET_NEAR_VALUE}')
+    parser.add_argument('--near-radius', type=float, help='max distance from --near in ly')
+    parser.add_argument('--market', action='append', default=[], help='distance from the nearest market, e.g. "faction=pirates min_distance=10" or "faction=hegemony min_size=6 max_distance=8", can be given more than once')
+    parser.add_argument('--planet', action='append', default=[], help='planet requirement, can be given more than once')
+    parser.add_argument('--distinct-planets', action='store_true', help='every --planet has to be matched by a different planet')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--top', type=int, help='only the best N systems by colony score, best first (instead of all of them by distance)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes the save is imported on')
+    parser.add_argument('--no-snapshot', action='store_true', help="don't use or make a snapshot of the save")
+    args = parser.parse_args()
+
+    try:
+        req_dicts = get_req_dicts(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    sector = lib.Sector()
+    with redirect_stdout(sys.stderr):
+        sector.load_from_xml(args.path, streaming=True, use_snapshot=not args.no_snapshot, workers=args.workers)
+
+    csv_writer = None
+    if args.format == 'csv':
+        csv_writer = csv.DictWriter(sys.stdout, CSV_COLUMNS)
+        csv_writer.writeheader()
+    try:
+        for req_index, req_dict in enumerate(req_dicts):
+            req_name = req_dict.get('name', f'req {req_index+1}')
+            try:
+                system_requirement = sector.get_system_req_from_dict(req_dict)
+            except ValueError as e:
+                print(f'{req_name}: {e}', file=sys.stderr)
+                continue
+            if args.top is not None:
+                scored_systems = sector.get_top_systems(system_requirement, args.top, vectorized=True, indexed=True)
+            else:
+                matching_systems = sector.get_matching_systems(system_requirement, vectorized=True, indexed=True)
+                scored_systems = [(system, None) for system in sorted(matching_systems, key=lambda system: system.dist)]
+            for system, score in scored_systems:
+                # systems without a score (e.q. -inf from ColonyScore for a system without planets) get null
+                system_dict = get_system_dict(system, req_name, round(score, 3) if score is not None and isfinite(score) else None)
+                if csv_writer is None:
+                    write_jsonl(sys.stdout, system_dict)
+                else:
+                    write_csv_rows(csv_writer, system_dict)
+            sys.stdout.flush()
+    except BrokenPipeError:
+        # e.g. piped into head, which stops reading early
+        sys.stderr.close()
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
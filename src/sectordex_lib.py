@@ -1,20 +1,59 @@
 from lxml import etree
 from numpy.linalg import norm
+import numpy as np
 import csv
 import os
 import glob
 from pathlib import Path
-import commentjson
+import json
 import re
+import hashlib
+import pickle
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import deque, OrderedDict
+from math import ceil, isfinite, sqrt
+from contextlib import contextmanager, redirect_stdout
+import io
+import gzip
+import bz2
+import lzma
+import zipfile
+import threading
+from time import monotonic
+import copy
+import heapq
 
 #from time import time
 
 
+def get_mod_id(mod_dir):
+    # enabled_mods.json lists mod ids, which don't have to match the folder names
+    try:
+        with open(mod_dir + '/mod_info.json', 'r') as f:
+            return load_scuffed_json(f.read())['id']
+    except (OSError, ValueError, KeyError, TypeError):
+        return os.path.basename(mod_dir)
+
+def get_data_dirs(starsector_dir_path):
+    # starsector-core followed by the installed mod folders which are enabled in the launcher
+    # (every installed mod if there is no enabled_mods.json)
+    mod_dirs = sorted([mod_dir for mod_dir in glob.glob(starsector_dir_path + '/mods/*') if os.path.isdir(mod_dir)])
+    try:
+        with open(starsector_dir_path + '/mods/enabled_mods.json', 'r') as f:
+            enabled_mod_ids = set(load_scuffed_json(f.read())['enabledMods'])
+        mod_dirs = [mod_dir for mod_dir in mod_dirs if get_mod_id(mod_dir) in enabled_mod_ids]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return [starsector_dir_path + '/starsector-core'] + mod_dirs
+
+def get_existing_files(data_dirs, rel_path):
+    return [data_dir + '/' + rel_path for data_dir in data_dirs if os.path.exists(data_dir + '/' + rel_path)]
+
 HAZARD_COND_MAP = {}
-def set_hazard_cond_map(starsector_dir_path):
+def set_hazard_cond_map(data_dirs):
     global HAZARD_COND_MAP
-    files = glob.glob(starsector_dir_path + '/starsector-core/data/campaign/procgen/condition_gen_data.csv') + \
-            glob.glob(starsector_dir_path + '/mods/*/data/campaign/procgen/condition_gen_data.csv')
+    files = get_existing_files(data_dirs, 'data/campaign/procgen/condition_gen_data.csv')
     for file in files:
         with open(file, 'r') as csv_file:
             reader = csv.DictReader(csv_file)
@@ -23,10 +62,9 @@ def set_hazard_cond_map(starsector_dir_path):
                     HAZARD_COND_MAP[row['id']] = float(row['hazard'])
 
 COND_ID_TO_NAME_MAP = {}
-def set_cond_id_name_map(starsector_dir_path):
+def set_cond_id_name_map(data_dirs):
     global COND_ID_TO_NAME_MAP
-    csv_files = glob.glob(starsector_dir_path + '/starsector-core/data/campaign/market_conditions.csv') + \
-                glob.glob(starsector_dir_path + '/mods/*/data/campaign/market_conditions.csv')
+    csv_files = get_existing_files(data_dirs, 'data/campaign/market_conditions.csv')
     for csv_file in csv_files:
         with open(csv_file, 'r') as f:
             reader = csv.DictReader(f)
@@ -38,23 +76,97 @@ def set_cond_id_name_map(starsector_dir_path):
                     COND_ID_TO_NAME_MAP[row['id']] = row['name']
 
 
-def clean_scuffed_json(json_str):
-    # remove hash comments
-    comment_regex = r'#.*\n'
-    json_str = re.sub(comment_regex, '\n', json_str)
-    # wrap non-string field name with quotes (e.q. id:"abc" instead of "id":"abc")
-    non_str_field_name_regex = r'(?<=\W\s)\w+(?=:)'
-    json_str = re.sub(non_str_field_name_regex, lambda match: f'"{match.group(0)}"', json_str)
-    # remove trailing commas (any comma right before closing bracket or end of the json string)
-    trailing_comma_regex = r',(?=((\s*[\}\]])|\s*$))' 
-    json_str = re.sub(trailing_comma_regex, '', json_str)
-    return json_str
+# starsector's json is relaxed: hash comments, unquoted field names/values and trailing commas are all fine
+# it gets tokenized in a single pass, with whitespace and comments skipped in front of every token
+# every bit of whitespace or comment can only be skipped in one way (comments run to the end of their line or their first */),
+# otherwise a token that doesn't match after a long run of them backtracks through exponentially many ways of splitting it up
+SCUFFED_JSON_TOKEN_REGEX = re.compile(r"""
+    (?:\s|\#[^\n]*(?![^\n])|//[^\n]*(?![^\n])|/\*(?:[^*]|\*(?!/))*\*/)*
+    (?:
+        (?P<punct>[{}\[\]:,])
+      | (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<word>[^\s{}\[\]:,"\#]+)
+      | (?P<end>\Z)
+    )""", re.VERBOSE | re.DOTALL)
+SCUFFED_JSON_NUMBER_REGEX = re.compile(r'-?\d+(\.\d*)?([eE][+-]?\d+)?')
+SCUFFED_JSON_WORDS = {'true': True, 'false': False, 'null': None}
+
+def get_scuffed_json_tokens(json_str):
+    pos = 0
+    while True:
+        match = SCUFFED_JSON_TOKEN_REGEX.match(json_str, pos)
+        if match is None:
+            raise ValueError(f'Invalid json at character {pos}')
+        if match.lastgroup == 'end':
+            return
+        yield match.lastgroup, match.group(match.lastgroup)
+        pos = match.end()
+
+def get_scuffed_json_string(text):
+    # only strings with escapes need decoding
+    if '\\' in text:
+        return json.loads(text, strict=False)
+    return text[1:-1]
+
+def get_scuffed_json_scalar(kind, text):
+    if kind == 'string':
+        return get_scuffed_json_string(text)
+    if text in SCUFFED_JSON_WORDS:
+        return SCUFFED_JSON_WORDS[text]
+    if (number_match := SCUFFED_JSON_NUMBER_REGEX.fullmatch(text)) is not None:
+        return int(text) if number_match.lastindex is None else float(text)
+    # unquoted string
+    return text
+
+def parse_scuffed_json_value(tokens, token):
+    kind, text = token
+    if text == '{' and kind == 'punct':
+        json_object = {}
+        # commas are skipped, which also takes care of trailing ones
+        while (token := next(tokens)) != ('punct', '}'):
+            if token == ('punct', ','):
+                continue
+            key_kind, key_text = token
+            if key_kind == 'punct':
+                raise ValueError(f'Expected a field name, got {key_text}')
+            if next(tokens) != ('punct', ':'):
+                raise ValueError(f'Expected : after field name {key_text}')
+            key = get_scuffed_json_string(key_text) if key_kind == 'string' else key_text
+            json_object[key] = parse_scuffed_json_value(tokens, next(tokens))
+        return json_object
+    if text == '[' and kind == 'punct':
+        json_array = []
+        while (token := next(tokens)) != ('punct', ']'):
+            if token == ('punct', ','):
+                continue
+            json_array.append(parse_scuffed_json_value(tokens, token))
+        return json_array
+    if kind == 'punct':
+        raise ValueError(f'Unexpected {text}')
+    return get_scuffed_json_scalar(kind, text)
+
+def load_scuffed_json(json_str):
+    tokens = get_scuffed_json_tokens(json_str)
+    try:
+        json_data = parse_scuffed_json_value(tokens, next(tokens))
+    except StopIteration:
+        raise ValueError('Unexpected end of json') from None
+    if next(tokens, None) is not None:
+        raise ValueError('Extra data after the end of json')
+    return json_data
+
+# salvageable payloads start with the salvageable id, which is all that's needed from them
+SALVAGEABLE_ID_REGEX = re.compile(r'\s*\{\s*"?f0"?\s*:\s*("(?:[^"\\]|\\.)*")')
+
+def get_salvageable_id(j0_str):
+    if (match := SALVAGEABLE_ID_REGEX.match(j0_str)) is not None:
+        return get_scuffed_json_string(match.group(1))
+    return load_scuffed_json(j0_str)['f0']
 
 FACTION_ID_TO_NAME_MAP = {}
-def set_faction_id_name_map(starsector_dir_path):
+def set_faction_id_name_map(data_dirs):
     global FACTION_ID_TO_NAME_MAP
-    csv_files = glob.glob(starsector_dir_path + '/starsector-core/data/world/factions/factions.csv') + \
-                glob.glob(starsector_dir_path + '/mods/*/data/world/factions/factions.csv')
+    csv_files = get_existing_files(data_dirs, 'data/world/factions/factions.csv')
     for csv_file in csv_files:
         faction_files = []
         with open(csv_file, 'r') as f:
@@ -65,34 +177,289 @@ def set_faction_id_name_map(starsector_dir_path):
                     faction_files.append(os.path.dirname(csv_file) + '/' + row['faction'].split('/')[-1])
         for faction_file in faction_files:
             with open(faction_file, 'r') as f:
-                scuffed_json = f.read()
-                clean_json = clean_scuffed_json(scuffed_json)
-                json_data = commentjson.loads(clean_scuffed_json(clean_json))
+                json_data = load_scuffed_json(f.read())
                 FACTION_ID_TO_NAME_MAP[json_data['id']] = json_data['displayName']
     
 TYPE_ID_TO_NAME_MAP = {}
-def set_type_id_name_map(starsector_dir_path):
+def set_type_id_name_map(data_dirs):
     global TYPE_ID_TO_NAME_MAP
-    json_files = glob.glob(starsector_dir_path + '/starsector-core/data/config/planets.json') + \
-                 glob.glob(starsector_dir_path + '/mods/*/data/config/planets.json')
+    json_files = get_existing_files(data_dirs, 'data/config/planets.json')
     for json_file in json_files:
         with open(json_file, 'r') as f:
-            json_data = commentjson.load(f)
+            json_data = load_scuffed_json(f.read())
             for type_id, type_data_dict in json_data.items():
                 TYPE_ID_TO_NAME_MAP[type_id] = type_data_dict['name']
 
+# data files (relative to starsector-core or a mod folder) which the maps above are read from
+DATA_FILE_PATTERNS = [
+    'data/campaign/procgen/condition_gen_data.csv',
+    'data/campaign/market_conditions.csv',
+    'data/world/factions/factions.csv',
+    'data/world/factions/*.faction',
+    'data/config/planets.json'
+]
+def get_data_files(starsector_dir_path, data_dirs=None):
+    if data_dirs is None:
+        data_dirs = get_data_dirs(starsector_dir_path)
+    data_files = []
+    for data_dir in data_dirs:
+        for pattern in DATA_FILE_PATTERNS:
+            data_files += sorted(glob.glob(data_dir + '/' + pattern))
+    return data_files
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.sectordex')
+CATALOG_CACHE_DIR = os.path.join(CACHE_DIR, 'catalogs')
+# bump this whenever the format of the cached maps changes
+CATALOG_CACHE_VERSION = 1
+
+def read_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def write_pickle(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temp file first so that an interrupted write never leaves a truncated file behind,
+    # with its own name so that processes writing the same file at once can't clobber each other's temp file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+        try:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+def get_catalog_cache_path(starsector_dir_path):
+    dir_hash = hashlib.sha1(os.path.abspath(starsector_dir_path).encode()).hexdigest()
+    return os.path.join(CATALOG_CACHE_DIR, f'{dir_hash}.pickle')
+
+def get_data_file_mtimes(data_files):
+    return {data_file: os.stat(data_file).st_mtime_ns for data_file in data_files}
+
+def get_catalog_maps():
+    return {
+        'hazard_cond_map': HAZARD_COND_MAP,
+        'cond_id_name_map': COND_ID_TO_NAME_MAP,
+        'type_id_name_map': TYPE_ID_TO_NAME_MAP,
+        'faction_id_name_map': FACTION_ID_TO_NAME_MAP
+    }
+
+def set_catalog_maps(maps):
+    # replaces (instead of merging into) the maps, so nothing is left over from a previously loaded install
+    # (copied first, since in a forked worker the given maps can be the same dicts as the module's)
+    for catalog_map, key in ((HAZARD_COND_MAP, 'hazard_cond_map'), (COND_ID_TO_NAME_MAP, 'cond_id_name_map'),
+                             (TYPE_ID_TO_NAME_MAP, 'type_id_name_map'), (FACTION_ID_TO_NAME_MAP, 'faction_id_name_map')):
+        new_items = dict(maps[key])
+        catalog_map.clear()
+        catalog_map.update(new_items)
+    clear_model_registries()
+
+def load_cached_catalogs(starsector_dir_path, data_file_mtimes):
+    try:
+        cache = read_pickle(get_catalog_cache_path(starsector_dir_path))
+        if cache['version'] != CATALOG_CACHE_VERSION or cache['data_file_mtimes'] != data_file_mtimes:
+            return False
+        set_catalog_maps(cache['maps'])
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError, TypeError):
+        return False
+    return True
+
+def save_cached_catalogs(starsector_dir_path, data_file_mtimes):
+    cache = {
+        'version': CATALOG_CACHE_VERSION,
+        'data_file_mtimes': data_file_mtimes,
+        'maps': get_catalog_maps()
+    }
+    try:
+        write_pickle(get_catalog_cache_path(starsector_dir_path), cache)
+    except OSError as e:
+        print(f'Could not save cached game data: {e}')
+
+def load_catalogs(starsector_dir_path, use_cache=True):
+    # sets all of the maps above from starsector-core and the enabled mods
+    # the merged maps are cached on disk until one of the data files they were read from changes
+    global loaded_catalogs_dir
+    data_dirs = get_data_dirs(starsector_dir_path)
+    data_file_mtimes = get_data_file_mtimes(get_data_files(starsector_dir_path, data_dirs))
+    loaded_catalogs_dir = starsector_dir_path
+    if use_cache and load_cached_catalogs(starsector_dir_path, data_file_mtimes):
+        return
+    set_catalog_maps({key: {} for key in get_catalog_maps()})
+    # each map is only written to by its own loader, so they can be loaded at the same time
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(set_map, data_dirs) for set_map in (set_hazard_cond_map, set_cond_id_name_map, set_type_id_name_map, set_faction_id_name_map)]
+        for future in futures:
+            future.result()
+    if use_cache:
+        save_cached_catalogs(starsector_dir_path, data_file_mtimes)
+
+def get_starsector_dir(path):
+    # saves normally sit at <starsector>/saves/<save>/campaign.xml, but a zipped save folder
+    # sits a level higher, so look for the folder containing starsector-core going upwards
+    search_dir = os.path.dirname(os.path.abspath(path))
+    for _ in range(4):
+        if os.path.isdir(search_dir + '/starsector-core'):
+            return search_dir
+        search_dir = os.path.dirname(search_dir)
+    return os.path.dirname(path) + '/../..'
+
+# magic bytes at the start of compressed campaign files and the function to open each of them with
+COMPRESSED_FILE_OPENERS = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open)
+]
+ZIP_MAGIC = b'PK\x03\x04'
+
+def get_campaign_xml_member(archive, path):
+    # the campaign.xml closest to the root of the archive (zipped save folders usually hold a single save)
+    members = [name for name in archive.namelist() if name == 'campaign.xml' or name.endswith('/campaign.xml')]
+    if not members:
+        raise FileNotFoundError(f'No campaign.xml in {path}')
+    return min(members, key=lambda name: name.count('/'))
+
+class ProgressReader:
+    # file object for the parser which reports how far into the save file on disk it has got
+    # (the position in the compressed file, since the size of the decompressed xml isn't known up front)
+    def __init__(self, f, raw_file, progress, phase):
+        self.f = f
+        self.raw_file = raw_file
+        self.progress = progress
+        self.phase = phase
+        self.bytes_total = os.fstat(raw_file.fileno()).st_size
+
+    def read(self, size=-1):
+        self.progress.update(self.phase, bytes_read=self.raw_file.tell(), bytes_total=self.bytes_total)
+        return self.f.read(size)
+
+@contextmanager
+def open_save_file(path, progress=None, phase=None):
+    # opens a campaign.xml for the parser, decompressing gzip/bz2/xz files and zipped save folders
+    # on the fly, so that they never have to be extracted to disk
+    with open(path, 'rb') as raw_file:
+        magic = raw_file.read(6)
+        raw_file.seek(0)
+        if magic.startswith(ZIP_MAGIC):
+            with zipfile.ZipFile(raw_file) as archive:
+                with archive.open(get_campaign_xml_member(archive, path)) as f:
+                    yield ProgressReader(f, raw_file, progress, phase) if progress is not None else f
+            return
+        opener = None
+        for compressed_magic, compressed_opener in COMPRESSED_FILE_OPENERS:
+            if magic.startswith(compressed_magic):
+                opener = compressed_opener
+        if opener is None:
+            yield ProgressReader(raw_file, raw_file, progress, phase) if progress is not None else raw_file
+            return
+        with opener(raw_file, 'rb') as f:
+            yield ProgressReader(f, raw_file, progress, phase) if progress is not None else f
+
+class ImportCancelled(Exception):
+    pass
+
+class ImportProgressEvent:
+    def __init__(self, phase, systems_done=None, systems_total=None, bytes_read=None, bytes_total=None):
+        self.phase = phase
+        self.systems_done = systems_done
+        self.systems_total = systems_total
+        self.bytes_read = bytes_read
+        self.bytes_total = bytes_total
+
+    def get_fraction(self):
+        # how far along the current phase is (None if it can't be told)
+        if self.bytes_total:
+            return self.bytes_read/self.bytes_total
+        if self.systems_total:
+            return self.systems_done/self.systems_total
+        return None
+
+    def __repr__(self):
+        repr_str = self.phase
+        if self.systems_total is not None:
+            repr_str += f' ({self.systems_done}/{self.systems_total} systems)'
+        if self.bytes_total is not None:
+            repr_str += f' ({self.bytes_read/1e6:0.1f}/{self.bytes_total/1e6:0.1f}MB)'
+        return repr_str
+
+class ImportProgress:
+    # lets the caller of load_from_xml follow the import through callback(ImportProgressEvent)
+    # and cancel it from another thread, in which case load_from_xml raises ImportCancelled
+    MIN_EVENT_INTERVAL = 0.05
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.cancelled = threading.Event()
+        self.phase = None
+        self.counts = {}
+        self.last_event_time = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def update(self, phase, **counts):
+        # called often during the import, this is where a cancelled import stops
+        if self.cancelled.is_set():
+            raise ImportCancelled()
+        if self.callback is None:
+            return
+        # the byte and system counts of a phase can come from different places, so keep the latest of each
+        if phase != self.phase:
+            self.phase = phase
+            self.counts = {}
+        elif monotonic() - self.last_event_time < ImportProgress.MIN_EVENT_INTERVAL:
+            self.counts.update(counts)
+            return
+        self.counts.update(counts)
+        self.last_event_time = monotonic()
+        self.callback(ImportProgressEvent(phase, **self.counts))
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+# bump this whenever the pickled classes change, so that old snapshots get thrown away
+SNAPSHOT_VERSION = 11
+
+def get_save_fingerprint(path):
+    # changes whenever the save, the installed mods or any of the game/mod data files change
+    starsector_dir = get_starsector_dir(path)
+    save_stat = os.stat(path)
+    fingerprint = hashlib.sha1()
+    fingerprint.update(f'{os.path.abspath(path)}|{save_stat.st_size}|{save_stat.st_mtime_ns}'.encode())
+    mod_dirs = sorted([os.path.basename(mod_dir) for mod_dir in glob.glob(starsector_dir + '/mods/*')])
+    fingerprint.update('|'.join(mod_dirs).encode())
+    for data_file in [starsector_dir + '/mods/enabled_mods.json'] + get_data_files(starsector_dir):
+        if os.path.exists(data_file):
+            fingerprint.update(os.path.relpath(data_file, starsector_dir).encode())
+            with open(data_file, 'rb') as f:
+                fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+def get_snapshot_path(path):
+    # one snapshot per save path, so a newer snapshot of the same save replaces the stale one
+    path_hash = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f'{path_hash}.pickle')
+
 class Planet:
+    __slots__ = ('id', 'name', 'type', 'system_id', 'population', 'resources', 'conditions', 'hazard', 'resource_levels')
+
     def __init__(self, id, name, type, conditions, system_id, population=None):
         self.id = id
         self.name = name
         self.type = type
         self.system_id = system_id
         self.population = population
-        self.resources = [cond for cond in conditions if cond.resource_level is not None]
-        self.conditions = [cond for cond in conditions if cond.resource_level is None]
-        self.hazard_conditions = [cond for cond in self.conditions if cond.hazard]
-        self.other_conditions = [cond for cond in self.conditions if not cond.hazard]
+        self.resources = tuple([cond for cond in conditions if cond.resource_level is not None])
+        self.conditions = tuple([cond for cond in conditions if cond.resource_level is None])
         self.hazard = 1 + sum([float(cond.hazard) for cond in self.hazard_conditions])
+        # best level of each resource family, see get_resource_levels
+        self.resource_levels = tuple(get_resource_levels(self.resources))
+
+    # the hazard/other split is only needed for showing planet details, so it isn't stored
+    @property
+    def hazard_conditions(self):
+        return [cond for cond in self.conditions if cond.hazard]
+
+    @property
+    def other_conditions(self):
+        return [cond for cond in self.conditions if not cond.hazard]
 
     def __repr__(self):
         repr_str = f'{self.name} ({self.hazard*100:0.0f}% {self.type}'
@@ -102,6 +469,8 @@ class Planet:
         return repr_str
 
 class Population:
+    __slots__ = ('size', 'faction_id', 'faction_name')
+
     def __init__(self, size, faction_id, faction_name):
         self.size = size
         self.faction_id = faction_id
@@ -135,6 +504,10 @@ class Condition:
     def __hash__(self):
         return hash(self.id)
 
+    def __reduce__(self):
+        # unpickled conditions (from worker processes or snapshots) go through the registry too
+        return (intern_condition, (self.id, self.name, self.hazard, self.resource_level))
+
 
 class Type:
     def __init__(self, id, name):
@@ -157,7 +530,51 @@ class Type:
     def __hash__(self):
         return hash(self.name)
 
+    def __reduce__(self):
+        return (intern_type, (self.id, self.name))
+
+# shared Condition/Type instances by id, so that every planet with the same condition or type points to the same object
+CONDITION_REGISTRY = {}
+TYPE_REGISTRY = {}
+
+def intern_condition(id, name=None, hazard=None, resource_level=None):
+    if (condition := CONDITION_REGISTRY.get(id)) is None:
+        condition = CONDITION_REGISTRY[id] = Condition(id, name, hazard, resource_level)
+    return condition
+
+def intern_type(id, name):
+    if (type := TYPE_REGISTRY.get(id)) is None:
+        type = TYPE_REGISTRY[id] = Type(id, name)
+    return type
+
+def get_condition(cond_id):
+    if (condition := CONDITION_REGISTRY.get(cond_id)) is not None:
+        return condition
+    return intern_condition(cond_id, COND_ID_TO_NAME_MAP[cond_id], HAZARD_COND_MAP.get(cond_id), RESOURCE_MAP.get(cond_id))
+
+def get_type(type_id):
+    if (type := TYPE_REGISTRY.get(type_id)) is not None:
+        return type
+    return intern_type(type_id, TYPE_ID_TO_NAME_MAP[type_id])
+
+def clear_model_registries():
+    # the shared instances hold names/hazards from the catalog maps, so they have to go when those change
+    CONDITION_REGISTRY.clear()
+    TYPE_REGISTRY.clear()
+
+def register_models(systems):
+    # puts the shared instances of systems built before the catalog maps were set (unpickled ones) back into the registries
+    for system in systems:
+        for planet in system.planets:
+            TYPE_REGISTRY.setdefault(planet.type.id, planet.type)
+            for cond in planet.conditions + planet.resources:
+                CONDITION_REGISTRY.setdefault(cond.id, cond)
+        for star in system.stars:
+            TYPE_REGISTRY.setdefault(star.type.id, star.type)
+
 class Star:
+    __slots__ = ('id', 'type', 'system_id')
+
     def __init__(self, id, type, system_id):
         self.id = id
         self.type = type
@@ -168,6 +585,8 @@ class Star:
 
 
 class StableLocation:
+    __slots__ = ('structure', 'makeshift')
+
     def __init__(self, structure=None, makeshift=False):
         self.structure = structure
         self.makeshift = makeshift
@@ -183,6 +602,8 @@ class StableLocation:
                 return string
 
 class Station:
+    __slots__ = ('id', 'name', 'population')
+
     def __init__(self, id, name, population):
         self.id = id
         self.name = name
@@ -195,6 +616,8 @@ class Station:
         return repr_str
 
 class StarSystem:
+    __slots__ = ('id', 'name', 'loc', 'themes', 'stars', 'planets', 'dist', 'is_inhabited', 'stable_locs', 'stations', 'num_jump_points', 'salvageables_dict')
+
     def __init__(self, id, name, loc, themes=None, star_list=None, planet_list=None, stable_locs=None, stations=None, num_jump_points=None, salvageables_dict=None, is_inhabited=False):
         self.id = id
         self.name = name
@@ -259,11 +682,658 @@ RUINS_LEVELS = [Condition(level) for level in RUINS_LEVELS]
 
 # ^^^ refactor how this spaghetti works later
 
-first_time_loading = True
-class Sector:
-    MIN_HAZARD = 9999
-    MAX_HAZARD = 0
+RESOURCE_LEVEL_LISTS = [ORE_LEVELS, RARE_ORE_LEVELS, FARMLAND_LEVELS, ORGANICS_LEVELS, VOLATILES_LEVELS, RUINS_LEVELS]
+# resource condition id -> (index of its list in RESOURCE_LEVEL_LISTS, index of the level in that list)
+RESOURCE_FAMILY_LEVEL_MAP = {cond.id: (family_index, level_index) for family_index, levels in enumerate(RESOURCE_LEVEL_LISTS) for level_index, cond in enumerate(levels)}
+NO_RESOURCE_LEVEL = -1
+CONDITION_BITS_PER_WORD = 64
+
+def get_resource_levels(resources):
+    # best level of each resource (index into its RESOURCE_LEVEL_LISTS list), NO_RESOURCE_LEVEL if there's none of it
+    resource_levels = [NO_RESOURCE_LEVEL]*len(RESOURCE_LEVEL_LISTS)
+    for resource in resources:
+        if resource.id in RESOURCE_FAMILY_LEVEL_MAP:
+            family_index, level_index = RESOURCE_FAMILY_LEVEL_MAP[resource.id]
+            resource_levels[family_index] = max(resource_levels[family_index], level_index)
+    return resource_levels
+
+def get_code_columns(value_lists):
+    # sorted vocabulary of the values, codes of the values of all lists one after another and the offsets of each list
+    vocab = sorted({value for values in value_lists for value in values})
+    value_codes = {value: code for code, value in enumerate(vocab)}
+    codes = np.array([value_codes[value] for values in value_lists for value in values], dtype=np.int32)
+    offsets = np.zeros(len(value_lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in value_lists], out=offsets[1:])
+    return vocab, codes, offsets
+
+def get_system_faction_ids(system):
+    # factions with a populated planet or station in the system
+    faction_ids = set()
+    for market_holder in system.planets + (system.stations or []):
+        if market_holder.population is not None and market_holder.population.faction_id is not None:
+            faction_ids.add(market_holder.population.faction_id)
+    return sorted(faction_ids)
+
+def get_inverted_index(value_lists):
+    # value -> sorted array of the indexes of the lists containing it
+    index = {}
+    for list_index, values in enumerate(value_lists):
+        for value in values:
+            index.setdefault(value, []).append(list_index)
+    return {value: np.unique(np.array(list_indexes, dtype=np.int64)) for value, list_indexes in index.items()}
+
+def segment_any(mask, offsets):
+    # for each segment offsets[i]:offsets[i+1] of the mask, whether any of it is set (False for empty segments)
+    return segment_count(mask, offsets) > 0
+
+def segment_count(mask, offsets):
+    # for each segment offsets[i]:offsets[i+1] of the mask, how much of it is set
+    mask_sums = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.cumsum(mask, out=mask_sums[1:])
+    return mask_sums[offsets[1:]] - mask_sums[offsets[:-1]]
+
+def find_distinct_match(req_index, req_planet_bits, planet_owners, visited):
+    # augmenting path from the req to a planet which is free, or whose req can move on to another free planet
+    free_bits = req_planet_bits[req_index] & ~visited[0]
+    while free_bits:
+        planet_bit = free_bits & -free_bits
+        free_bits ^= planet_bit
+        visited[0] |= planet_bit
+        owner_index = planet_owners.get(planet_bit)
+        if owner_index is None or find_distinct_match(owner_index, req_planet_bits, planet_owners, visited):
+            planet_owners[planet_bit] = req_index
+            return True
+    return False
+
+def has_distinct_matches(req_planet_bits):
+    # whether every req can have a planet of its own (bipartite matching of reqs to planets)
+    # req_planet_bits has an int for each req, with bit i set if planet i matches it
+    all_planet_bits = 0
+    for planet_bits in req_planet_bits:
+        if not planet_bits:
+            return False
+        all_planet_bits |= planet_bits
+    if bin(all_planet_bits).count('1') < len(req_planet_bits):
+        return False
+    # reqs with the fewest matching planets go first, so that most of them get a planet without any augmenting
+    planet_owners = {}
+    for req_index in sorted(range(len(req_planet_bits)), key=lambda req_index: bin(req_planet_bits[req_index]).count('1')):
+        if not find_distinct_match(req_index, req_planet_bits, planet_owners, [0]):
+            return False
+    return True
+
+class SectorColumns:
+    # struct of arrays view of the systems and their planets, so sector wide stuff can be done with array operations
+    # planets are stored system by system, the planets of system i are rows planet_offsets[i]:planet_offsets[i+1]
+    def __init__(self, systems):
+        planets = [planet for system in systems for planet in system.planets]
+        self.system_locs = np.array([system.loc for system in systems], dtype=np.float64).reshape(-1, 2)
+        self.system_dists = np.array([system.dist for system in systems], dtype=np.float64)
+        self.system_planet_nums = np.array([len(system.planets) for system in systems], dtype=np.int32)
+        self.system_inhabited = np.array([system.is_inhabited for system in systems], dtype=bool)
+        self.system_jump_point_nums = np.array([system.num_jump_points or 0 for system in systems], dtype=np.int32)
+        self.system_stable_loc_nums = np.array([len(system.stable_locs or ()) for system in systems], dtype=np.int32)
+        self.system_salvageable_nums = np.array([sum((system.salvageables_dict or {}).values()) for system in systems], dtype=np.int32)
+        self.system_indexes = {system.id: system_index for system_index, system in enumerate(systems)}
+        self.planet_offsets = np.zeros(len(systems) + 1, dtype=np.int64)
+        np.cumsum(self.system_planet_nums, out=self.planet_offsets[1:])
+        self.planet_system_indices = np.repeat(np.arange(len(systems)), self.system_planet_nums)
+        self.planet_hazards = np.array([planet.hazard for planet in planets], dtype=np.float64)
+        # types are told apart by name, same as Type.__eq__
+        self.type_names = sorted({planet.type.name for planet in planets})
+        type_codes = {type_name: code for code, type_name in enumerate(self.type_names)}
+        self.planet_type_codes = np.array([type_codes[planet.type.name] for planet in planets], dtype=np.int32)
+        self.planet_resource_levels = np.array([planet.resource_levels for planet in planets], dtype=np.int8).reshape(-1, len(RESOURCE_LEVEL_LISTS))
+        # (non resource) conditions of each planet as a bitmask over the conditions found in the sector,
+        # split into as many 64 bit words as needed
+        self.condition_ids, condition_codes, condition_offsets = get_code_columns([[cond.id for cond in planet.conditions] for planet in planets])
+        self.condition_bit_indices = {cond_id: bit_index for bit_index, cond_id in enumerate(self.condition_ids)}
+        word_num = max(1, ceil(len(self.condition_ids)/CONDITION_BITS_PER_WORD))
+        self.planet_condition_bits = np.zeros((len(planets), word_num), dtype=np.uint64)
+        planet_indices = np.repeat(np.arange(len(planets)), np.diff(condition_offsets))
+        condition_bits = np.left_shift(np.uint64(1), (condition_codes % CONDITION_BITS_PER_WORD).astype(np.uint64))
+        np.bitwise_or.at(self.planet_condition_bits, (planet_indices, condition_codes // CONDITION_BITS_PER_WORD), condition_bits)
+        self.theme_names, self.system_theme_codes, self.system_theme_offsets = get_code_columns([system.themes for system in systems])
+        self.faction_ids, self.system_faction_codes, self.system_faction_offsets = get_code_columns([get_system_faction_ids(system) for system in systems])
+
+    def get_condition_bits(self, cond_ids):
+        # bitmask of the conditions, and whether all of them were found in the sector (the others can't be in the mask)
+        bits = np.zeros(self.planet_condition_bits.shape[1], dtype=np.uint64)
+        all_found = True
+        for cond_id in cond_ids:
+            if (bit_index := self.condition_bit_indices.get(cond_id)) is None:
+                all_found = False
+                continue
+            bits[bit_index // CONDITION_BITS_PER_WORD] |= np.uint64(1) << np.uint64(bit_index % CONDITION_BITS_PER_WORD)
+        return bits, all_found
+
+    def get_system_theme_mask(self, theme):
+        if theme not in self.theme_names:
+            return np.zeros(self.get_system_num(), dtype=bool)
+        return segment_any(self.system_theme_codes == self.theme_names.index(theme), self.system_theme_offsets)
+
+    def get_system_faction_mask(self, faction_id):
+        if faction_id not in self.faction_ids:
+            return np.zeros(self.get_system_num(), dtype=bool)
+        return segment_any(self.system_faction_codes == self.faction_ids.index(faction_id), self.system_faction_offsets)
+
+    def get_system_num(self):
+        return len(self.system_dists)
+
+    def get_planet_num(self):
+        return len(self.planet_hazards)
+
+def get_squared_dists(locs, loc):
+    # squared distances are compared everywhere (instead of norms) so every search path agrees on systems right at the limit
+    offsets = locs - np.asarray(loc, dtype=np.float64)
+    return offsets[:, 0]*offsets[:, 0] + offsets[:, 1]*offsets[:, 1]
+
+class SpatialIndex:
+    # uniform grid over the system locations, so radius and nearest neighbour searches only look at the cells around a point
+    SYSTEMS_PER_CELL = 4
+
+    def __init__(self, locs):
+        self.locs = np.asarray(locs, dtype=np.float64).reshape(-1, 2)
+        self.cells = {}
+        self.origin = np.zeros(2)
+        self.cell_size = 1.0
+        self.max_cell = np.zeros(2, dtype=np.int64)
+        if not len(self.locs):
+            return
+        self.origin = self.locs.min(axis=0)
+        extent = self.locs.max(axis=0) - self.origin
+        if extent[0] > 0 and extent[1] > 0:
+            self.cell_size = sqrt(extent[0]*extent[1]*self.SYSTEMS_PER_CELL/len(self.locs))
+        elif extent.max() > 0:
+            self.cell_size = extent.max()*self.SYSTEMS_PER_CELL/len(self.locs)
+        cell_coords = self.get_cell_coords(self.locs)
+        self.max_cell = cell_coords.max(axis=0)
+        # system indexes sorted by cell, then sliced up per cell
+        order = np.lexsort((cell_coords[:, 1], cell_coords[:, 0]))
+        sorted_cell_coords = cell_coords[order]
+        cell_starts = np.flatnonzero(np.any(np.diff(sorted_cell_coords, axis=0) != 0, axis=1)) + 1
+        for start, end in zip(np.concatenate(([0], cell_starts)), np.concatenate((cell_starts, [len(order)]))):
+            self.cells[tuple(sorted_cell_coords[start].tolist())] = order[start:end]
+
+    def get_cell_coords(self, locs):
+        return np.floor((locs - self.origin)/self.cell_size).astype(np.int64)
+
+    def get_within_radius(self, loc, radius):
+        # indexes of the systems at most radius away from loc, in ascending order
+        loc = np.asarray(loc, dtype=np.float64)
+        # one extra cell on each side, in case rounding puts a system right at the limit into the next cell
+        low_cell = np.maximum(self.get_cell_coords(loc - radius) - 1, 0)
+        high_cell = np.minimum(self.get_cell_coords(loc + radius) + 1, self.max_cell)
+        if np.any(high_cell < low_cell):
+            return np.array([], dtype=np.int64)
+        if np.prod(high_cell - low_cell + 1) >= len(self.cells):
+            # the search covers most of the grid anyway
+            candidates = np.arange(len(self.locs))
+        else:
+            cell_systems = [self.cells[cell] for cell in ((x, y) for x in range(low_cell[0], high_cell[0] + 1) for y in range(low_cell[1], high_cell[1] + 1)) if cell in self.cells]
+            if not cell_systems:
+                return np.array([], dtype=np.int64)
+            candidates = np.sort(np.concatenate(cell_systems))
+        return candidates[get_squared_dists(self.locs[candidates], loc) <= radius*radius]
+
+    def get_nearest(self, loc, k, excluded_index=None):
+        # indexes of the k systems nearest to loc, nearest first (ties go to the lower index)
+        if k <= 0 or not len(self.locs):
+            return np.array([], dtype=np.int64)
+        # every system within the search radius is found, so once it holds k systems those are the k nearest
+        max_radius = sqrt(get_squared_dists(np.array([self.origin, self.origin + (self.max_cell + 1)*self.cell_size]), loc).max())*2
+        radius = self.cell_size
+        while True:
+            indexes = self.get_within_radius(loc, radius)
+            if excluded_index is not None:
+                indexes = indexes[indexes != excluded_index]
+            if len(indexes) >= k or radius > max_radius:
+                break
+            radius *= 2
+        nearest_order = np.argsort(get_squared_dists(self.locs[indexes], loc), kind='stable')[:k]
+        return indexes[nearest_order]
+
+# above this fraction of the systems as candidates, checking them one by one is slower than evaluating masks
+MAX_INDEXED_CANDIDATE_FRACTION = 0.1
+
+class SectorIndex:
+    # inverted indexes for picking out candidate systems of a search without scanning all of them
+    def __init__(self, systems, columns):
+        planets = [planet for system in systems for planet in system.planets]
+        self.columns = columns
+        self.condition_planets = get_inverted_index([[cond.id for cond in planet.conditions] for planet in planets])
+        self.type_planets = get_inverted_index([[planet.type.name] for planet in planets])
+        self.theme_systems = get_inverted_index([system.themes for system in systems])
+        self.faction_systems = get_inverted_index([get_system_faction_ids(system) for system in systems])
+        self.spatial_index = SpatialIndex(columns.system_locs)
+
+    def get_planet_req_candidates(self, planet_req):
+        # systems which have a planet that could match the req, going by its required types and conditions (None if it has neither)
+        candidate_planets = None
+        if planet_req.desired_types and not planet_req.exclusive_type_mode:
+            type_planets = [self.type_planets[type.name] for type in planet_req.desired_types if type.name in self.type_planets]
+            candidate_planets = np.unique(np.concatenate(type_planets)) if type_planets else np.array([], dtype=np.int64)
+        if planet_req.desired_conditions and not planet_req.exclusive_cond_mode:
+            for cond in planet_req.desired_conditions:
+                cond_planets = self.condition_planets.get(cond.id, np.array([], dtype=np.int64))
+                candidate_planets = cond_planets if candidate_planets is None else np.intersect1d(candidate_planets, cond_planets, assume_unique=True)
+        if candidate_planets is None:
+            return None
+        return np.unique(self.columns.planet_system_indices[candidate_planets])
+
+    def get_candidates(self, criterion, value):
+        # systems which can meet the criterion (None if it can't be narrowed down) and whether all of them do
+        if criterion == 'max_distance':
+            return np.flatnonzero(self.columns.system_dists <= value), True
+        if criterion == 'min_planet_num':
+            return np.flatnonzero(self.columns.system_planet_nums >= value), True
+        if criterion == 'desired_theme':
+            return self.theme_systems.get(value, np.array([], dtype=np.int64)), True
+        if criterion == 'desired_faction':
+            return self.faction_systems.get(value, np.array([], dtype=np.int64)), True
+        if criterion == 'must_be_uninhabited':
+            return np.flatnonzero(~self.columns.system_inhabited), True
+        if criterion == 'near_loc':
+            return self.spatial_index.get_within_radius(*value), True
+        if criterion == 'market_distance':
+            return np.flatnonzero(value.get_mask(self.columns)), True
+        if criterion == 'planet_req':
+            return self.get_planet_req_candidates(value), False
+        return None, False
+
+    def get_query_plan(self, system_requirement):
+        # candidates come from the criterion which leaves the fewest systems,
+        # the other criteria get checked from the most to the least selective one (planet reqs last among equals since they're slower)
+        system_num = self.columns.get_system_num()
+        estimates = []
+        best_candidates = None
+        best_index = None
+        for criterion_index, (criterion, value, predicate) in enumerate(system_requirement.get_predicates()):
+            candidates, is_exact = self.get_candidates(criterion, value)
+            fraction = 1 if candidates is None or not system_num else len(candidates)/system_num
+            estimates.append((fraction, criterion == 'planet_req', criterion_index, criterion, predicate, is_exact))
+            if candidates is not None and (best_candidates is None or len(candidates) < len(best_candidates)):
+                best_candidates = candidates
+                best_index = criterion_index
+        predicates = []
+        criteria = []
+        for fraction, _, criterion_index, criterion, predicate, is_exact in sorted(estimates, key=lambda estimate: estimate[:3]):
+            # the candidates already meet the criterion they came from, unless they're only an estimate
+            if criterion_index == best_index and is_exact:
+                continue
+            predicates.append(predicate)
+            criteria.append(criterion)
+        if best_candidates is None:
+            best_candidates = np.arange(system_num)
+        return QueryPlan(best_candidates, predicates, criteria)
+
+class QueryPlan:
+    def __init__(self, candidates, predicates, criteria):
+        self.candidates = candidates
+        self.predicates = predicates
+        self.criteria = criteria
+
+    def is_selective(self, system_num):
+        return len(self.candidates) <= MAX_INDEXED_CANDIDATE_FRACTION*system_num
+
+    def get_matching_systems(self, systems):
+        matching_systems = []
+        for system_index in self.candidates:
+            system = systems[system_index]
+            if all(predicate(system) for predicate in self.predicates):
+                matching_systems.append(system)
+        return matching_systems
+
+    def __repr__(self):
+        return f'<query plan: {len(self.candidates)} candidates, then {", ".join(self.criteria) or "nothing"}>'
+
+def is_tighter_planet_req(key, other_key):
+    # whether every planet matching the PlanetReq with the cache key also matches the one with other_key
+    types, exclusive_type_mode, conditions, exclusive_cond_mode, hazard, resource_minimums = key
+    other_types, other_exclusive_type_mode, other_conditions, other_exclusive_cond_mode, other_hazard, other_resource_minimums = other_key
+    if other_types:
+        if not other_exclusive_type_mode and not (types and not exclusive_type_mode and types <= other_types):
+            return False
+        if other_exclusive_type_mode and not (types and (types >= other_types if exclusive_type_mode else types.isdisjoint(other_types))):
+            return False
+    if other_conditions and not (exclusive_cond_mode == other_exclusive_cond_mode and conditions >= other_conditions):
+        return False
+    if other_hazard is not None and (hazard is None or hazard > other_hazard):
+        return False
+    for family_index, other_min_level_index in other_resource_minimums:
+        if not any([resource_family_index == family_index and min_level_index >= other_min_level_index for resource_family_index, min_level_index in resource_minimums]):
+            return False
+    return True
+
+def is_tighter_system_req(key, other_key):
+    # whether every system matching the StarSystemReq with the cache key also matches the one with other_key
+    # ExpressionReq keys only match themselves
+    if key[0] == 'expression' or other_key[0] == 'expression':
+        return False
+    max_distance, min_planet_num, theme, faction, near, must_be_uninhabited, distinct_planets, market_distance_req_keys, planet_req_keys = key
+    other_max_distance, other_min_planet_num, other_theme, other_faction, other_near, other_must_be_uninhabited, other_distinct_planets, other_market_distance_req_keys, other_planet_req_keys = other_key
+    if other_max_distance is not None and (max_distance is None or max_distance > other_max_distance):
+        return False
+    if other_min_planet_num is not None and (min_planet_num is None or min_planet_num < other_min_planet_num):
+        return False
+    if other_theme is not None and theme != other_theme:
+        return False
+    if other_faction is not None and faction != other_faction:
+        return False
+    # only searches around the same point are compared
+    if other_near is not None and (near is None or near[0] != other_near[0] or near[1] > other_near[1]):
+        return False
+    if other_must_be_uninhabited and not must_be_uninhabited:
+        return False
+    if not all([any([is_tighter_market_distance_req(market_distance_req_key, other_market_distance_req_key) for market_distance_req_key in market_distance_req_keys]) for other_market_distance_req_key in other_market_distance_req_keys]):
+        return False
+    if other_distinct_planets:
+        # each of the other planet reqs has to be implied by a different one of these
+        if not distinct_planets:
+            return False
+        return has_distinct_matches([sum([1 << key_index for key_index, planet_req_key in enumerate(planet_req_keys) if is_tighter_planet_req(planet_req_key, other_planet_req_key)])
+                                     for other_planet_req_key in other_planet_req_keys])
+    # each of the other planet reqs has to be implied by one of these
+    return all([any([is_tighter_planet_req(planet_req_key, other_planet_req_key) for planet_req_key in planet_req_keys]) for other_planet_req_key in other_planet_req_keys])
+
+QUERY_CACHE_SIZE = 32
+
+class QueryCache:
+    # matching systems of recent searches by the cache key of their StarSystemReq, the least recently used one gets dropped when it's full
+    def __init__(self, max_size=QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self.results = OrderedDict()
+
+    def get(self, key):
+        if key not in self.results:
+            return None
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def get_looser(self, key):
+        # smallest result of a cached search which every match of the search with the key also matches
+        looser_systems = None
+        for cached_key, cached_systems in self.results.items():
+            if (looser_systems is None or len(cached_systems) < len(looser_systems)) and is_tighter_system_req(key, cached_key):
+                looser_systems = cached_systems
+        return looser_systems
+
+    def add(self, key, systems):
+        self.results[key] = systems
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+class ColonyScore:
+    # default score for ranked searches: the best planet of the system (sum of its resources' RESOURCE_MAP values,
+    # minus hazard_weight for every 100% of hazard above 100%), plus stable locations and salvageables, minus distance from the center
+    # systems without planets get -inf
+    # any other score works the same way: called with the SectorColumns and an array of system indexes, returns an array of scores
+    def __init__(self, resource_weight=1, hazard_weight=2, stable_loc_weight=0.5, salvageable_weight=0.25, dist_weight=0.02):
+        self.resource_weight = resource_weight
+        self.hazard_weight = hazard_weight
+        self.stable_loc_weight = stable_loc_weight
+        self.salvageable_weight = salvageable_weight
+        self.dist_weight = dist_weight
+        # RESOURCE_MAP value of each level of each resource, with an extra 0 at the end for NO_RESOURCE_LEVEL (-1)
+        max_level_num = max([len(levels) for levels in RESOURCE_LEVEL_LISTS])
+        self.resource_values = np.zeros((len(RESOURCE_LEVEL_LISTS), max_level_num + 1))
+        for family_index, levels in enumerate(RESOURCE_LEVEL_LISTS):
+            for level_index, level in enumerate(levels):
+                self.resource_values[family_index, level_index] = RESOURCE_MAP[level.id]
+
+    def get_planet_scores(self, columns):
+        family_indexes = np.arange(len(RESOURCE_LEVEL_LISTS))
+        resource_scores = self.resource_values[family_indexes, columns.planet_resource_levels].sum(axis=1)
+        return self.resource_weight*resource_scores - self.hazard_weight*(columns.planet_hazards - 1)
+
+    def __call__(self, columns, system_indexes):
+        best_planet_scores = np.full(columns.get_system_num(), -np.inf)
+        np.maximum.at(best_planet_scores, columns.planet_system_indices, self.get_planet_scores(columns))
+        return (best_planet_scores[system_indexes]
+                + self.stable_loc_weight*columns.system_stable_loc_nums[system_indexes]
+                + self.salvageable_weight*columns.system_salvageable_nums[system_indexes]
+                - self.dist_weight*columns.system_dists[system_indexes])
+
+def get_row_bits(mask_rows):
+    # each row of a 2d bool array as an int, with bit i set if column i is
+    packed_rows = np.packbits(mask_rows, axis=1, bitorder='little')
+    return [int.from_bytes(packed_row.tobytes(), 'little') for packed_row in packed_rows]
+
+class ClusterSearch:
+    # groups of different systems, one for each member req, which are all at most max_distance ly apart from each other
+    # (anchored: from the first member's system) and which together have a planet matching each of the covered planet reqs
+    # member_masks/cover_masks have a row of systems for each member req/covered planet req
+    # every group is within max_distance of one of its systems (picked for the most selective member), so the search goes
+    # through the spatial index neighbourhood of each candidate of that member, where systems are tracked as int bitsets
+    def __init__(self, spatial_index, member_masks, cover_masks, member_keys, max_distance, anchored=False):
+        self.spatial_index = spatial_index
+        self.member_masks = member_masks
+        self.cover_masks = cover_masks
+        self.max_distance = max_distance
+        self.anchored = anchored
+        self.all_covered = (1 << len(cover_masks)) - 1
+        member_num = len(member_masks)
+        candidate_nums = member_masks.sum(axis=1)
+        # the anchor has to go first, otherwise the member with the fewest candidates
+        self.first_member = 0 if anchored else int(np.argmin(candidate_nums))
+        other_members = sorted([member for member in range(member_num) if member != self.first_member], key=lambda member: (candidate_nums[member], member))
+        self.member_order = [self.first_member] + other_members
+        # members with the same req would find each group once for every order of its systems,
+        # so their systems have to be in ascending order (in the order of the members)
+        # they have the same number of candidates, so they're already in that order in member_order
+        # an anchor is left out of this, since any system of the group can be the one the others are near to
+        self.previous_same_members = [None]*member_num
+        for member in range(member_num):
+            for other_member in range(1 if anchored else 0, member):
+                if member_keys[other_member] == member_keys[member]:
+                    self.previous_same_members[member] = other_member
+        self.relevant_mask = member_masks.any(axis=0)
+
+    def get_clusters(self, max_cluster_num=None):
+        # lists of system indexes (in member order), in the order of their first member's system
+        clusters = []
+        for first_index in np.flatnonzero(self.member_masks[self.first_member]):
+            for cluster in self.get_neighbourhood_clusters(first_index):
+                clusters.append(cluster)
+                if max_cluster_num is not None and len(clusters) >= max_cluster_num:
+                    return clusters
+        return clusters
+
+    def get_neighbourhood_clusters(self, first_index):
+        neighbour_indexes = self.spatial_index.get_within_radius(self.spatial_index.locs[first_index], self.max_distance)
+        neighbour_indexes = neighbour_indexes[self.relevant_mask[neighbour_indexes]]
+        neighbour_member_masks = self.member_masks[:, neighbour_indexes]
+        neighbour_cover_masks = self.cover_masks[:, neighbour_indexes]
+        # the neighbourhood has to have a candidate for every member and a planet for every covered req
+        if not neighbour_member_masks.any(axis=1).all() or not neighbour_cover_masks.any(axis=1).all():
+            return
+        # bit i of all of these is neighbour_indexes[i]
+        self.member_bits = get_row_bits(neighbour_member_masks)
+        self.cover_bits = get_row_bits(neighbour_cover_masks)
+        # covered reqs of each neighbour, as bits of the covered planet reqs
+        self.neighbour_covers = get_row_bits(neighbour_cover_masks.T) if len(self.cover_masks) else [0]*len(neighbour_indexes)
+        if self.anchored:
+            self.adjacent_bits = None
+        else:
+            neighbour_locs = self.spatial_index.locs[neighbour_indexes]
+            offsets = neighbour_locs[:, None, :] - neighbour_locs[None, :, :]
+            self.adjacent_bits = get_row_bits((offsets*offsets).sum(axis=2) <= self.max_distance*self.max_distance)
+        self.neighbour_indexes = neighbour_indexes
+        first_position = int(np.searchsorted(neighbour_indexes, first_index))
+        assigned_positions = [None]*len(self.member_masks)
+        yield from self.get_assignments(0, first_position, (1 << len(neighbour_indexes)) - 1, 0, assigned_positions)
+
+    def get_assignments(self, order_index, position, compatible_bits, covered, assigned_positions):
+        # assigns the neighbour at position to member_order[order_index], then goes on with the next member
+        position_bit = 1 << position
+        member = self.member_order[order_index]
+        assigned_positions[member] = position
+        compatible_bits &= ~position_bit
+        if self.adjacent_bits is not None:
+            compatible_bits &= self.adjacent_bits[position]
+        covered |= self.neighbour_covers[position]
+        if order_index + 1 == len(self.member_order):
+            if covered == self.all_covered:
+                yield [int(self.neighbour_indexes[assigned_position]) for assigned_position in assigned_positions]
+            assigned_positions[member] = None
+            return
+        if self.is_feasible(order_index + 1, compatible_bits, covered):
+            next_member = self.member_order[order_index + 1]
+            choice_bits = self.member_bits[next_member] & compatible_bits
+            if (previous_member := self.previous_same_members[next_member]) is not None:
+                # only neighbours after the previous member's one
+                choice_bits &= ~((1 << (assigned_positions[previous_member] + 1)) - 1)
+            while choice_bits:
+                choice_bit = choice_bits & -choice_bits
+                choice_bits ^= choice_bit
+                yield from self.get_assignments(order_index + 1, choice_bit.bit_length() - 1, compatible_bits, covered, assigned_positions)
+        assigned_positions[member] = None
+
+    def is_feasible(self, order_index, compatible_bits, covered):
+        # whether the members from order_index on can still all be assigned, and still cover everything left, at best
+        remaining_bits = 0
+        for member in self.member_order[order_index:]:
+            member_bits = self.member_bits[member] & compatible_bits
+            if not member_bits:
+                return False
+            remaining_bits |= member_bits
+        missing = self.all_covered & ~covered
+        while missing:
+            cover_bit = missing & -missing
+            missing ^= cover_bit
+            if not self.cover_bits[cover_bit.bit_length() - 1] & remaining_bits:
+                return False
+        return True
+
+# systems per chunk when working out market distances, so the system x market distance arrays stay small
+MARKET_DISTANCE_CHUNK_SIZE = 256
+
+class MarketDistances:
+    # distance in ly from each system to the nearest system with a market (populated planet or station) of each faction,
+    # for each market size and up, worked out once when the sector is loaded
+    # faction None is the nearest market of any faction
+    def __init__(self, systems, columns):
+        self.system_indexes = columns.system_indexes
+        self.system_num = columns.get_system_num()
+        # faction id -> {system index: size of the biggest market of the faction there}
+        faction_market_sizes = {}
+        for system_index, system in enumerate(systems):
+            for market_holder in system.planets + (system.stations or []):
+                population = market_holder.population
+                if population is None or population.faction_id is None:
+                    continue
+                for faction_id in (population.faction_id, None):
+                    market_sizes = faction_market_sizes.setdefault(faction_id, {})
+                    market_sizes[system_index] = max(market_sizes.get(system_index, 0), population.size)
+        # faction id -> (market sizes ascending, array of the distances to the nearest market of at least each size)
+        self.faction_dists = {faction_id: self.get_nearest_market_dists(columns.system_locs, market_sizes) for faction_id, market_sizes in faction_market_sizes.items()}
+
+    def get_nearest_market_dists(self, system_locs, market_sizes):
+        # markets sorted from the biggest size down, so the markets of at least each size are a slice from the start
+        market_indexes = np.array(sorted(market_sizes, key=lambda system_index: -market_sizes[system_index]), dtype=np.int64)
+        sizes = np.array([market_sizes[system_index] for system_index in market_indexes])
+        distinct_sizes = np.unique(sizes)
+        size_ends = [np.count_nonzero(sizes >= size) for size in distinct_sizes]
+        market_locs = system_locs[market_indexes]
+        squared_dists = np.empty((len(distinct_sizes), self.system_num))
+        for start in range(0, self.system_num, MARKET_DISTANCE_CHUNK_SIZE):
+            chunk_locs = system_locs[start:start+MARKET_DISTANCE_CHUNK_SIZE]
+            x_offsets = chunk_locs[:, 0:1] - market_locs[:, 0]
+            y_offsets = chunk_locs[:, 1:2] - market_locs[:, 1]
+            chunk_squared_dists = x_offsets*x_offsets + y_offsets*y_offsets
+            # nearest of the markets of the biggest size, then of those and the next size down etc
+            nearest = np.full(len(chunk_locs), np.inf)
+            size_start = 0
+            for size_index in range(len(distinct_sizes) - 1, -1, -1):
+                size_end = size_ends[size_index]
+                nearest = np.minimum(nearest, chunk_squared_dists[:, size_start:size_end].min(axis=1))
+                squared_dists[size_index, start:start+len(chunk_locs)] = nearest
+                size_start = size_end
+        return distinct_sizes, np.sqrt(squared_dists)
+
+    def get_dists(self, faction_id=None, min_size=None):
+        # distance of each system to the nearest market of the faction of at least min_size, inf if there's none
+        if faction_id not in self.faction_dists:
+            return np.full(self.system_num, np.inf)
+        sizes, dists = self.faction_dists[faction_id]
+        size_index = 0 if min_size is None else int(np.searchsorted(sizes, min_size))
+        if size_index == len(sizes):
+            return np.full(self.system_num, np.inf)
+        return dists[size_index]
+
+class MarketDistanceReq:
+    # distance range from the nearest market of a faction (any faction if None) of at least min_size, see Sector.get_market_distance_req
+    # the distances come from the sector's MarketDistances, so a req only works for the sector it's made for
+    def __init__(self, market_distances, faction_id=None, min_size=None, min_distance=None, max_distance=None):
+        self.faction_id = faction_id
+        self.min_size = min_size
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.system_indexes = market_distances.system_indexes
+        self.dists = market_distances.get_dists(faction_id, min_size)
+
+    def check(self, system):
+        dist = self.dists[self.system_indexes[system.id]]
+        if self.min_distance is not None and dist < self.min_distance:
+            return False
+        if self.max_distance is not None and dist > self.max_distance:
+            return False
+        return True
+
+    def get_mask(self, columns):
+        mask = np.ones(columns.get_system_num(), dtype=bool)
+        if self.min_distance is not None:
+            mask &= self.dists >= self.min_distance
+        if self.max_distance is not None:
+            mask &= self.dists <= self.max_distance
+        return mask
+
+    def get_cache_key(self):
+        return (self.faction_id, self.min_size, self.min_distance, self.max_distance)
+
+    def __reduce__(self):
+        # only the bounds get pickled (e.q. for every chunk of a QueryPool search), the distances are looked up again
+        # in the MarketDistances the worker got when it started
+        return (get_query_market_distance_req, self.get_cache_key())
+
+    def __repr__(self):
+        faction_str = self.faction_id or 'any faction'
+        size_str = f' size {self.min_size}+' if self.min_size is not None else ''
+        return f'<market distance req: {self.min_distance} to {self.max_distance} ly from {faction_str}{size_str}>'
+
+def is_tighter_market_distance_req(key, other_key):
+    # whether every system matching the MarketDistanceReq with the cache key also matches the one with other_key
+    faction_id, min_size, min_distance, max_distance = key
+    other_faction_id, other_min_size, other_min_distance, other_max_distance = other_key
+    if faction_id != other_faction_id or min_size != other_min_size:
+        return False
+    if other_min_distance is not None and (min_distance is None or min_distance < other_min_distance):
+        return False
+    if other_max_distance is not None and (max_distance is None or max_distance > other_max_distance):
+        return False
+    return True
+
+# game coordinates are in px
+LY_PER_PX = 1/2000
+
+# tags which the nodes defining the contents of a system normally use
+SYSTEM_TAGS = ('s', 'Sstm', 'cL')
 
+# top level nodes of campaign.xml that are kept when streaming
+XML_HEADER_TAGS = ('seedString', 'characterData', 'modAndPluginData', 'starSystems', 'playerFleet')
+
+def clear_xml_node(node):
+    # free a fully parsed node and the already parsed siblings before it
+    node.clear()
+    parent = node.getparent()
+    while node.getprevious() is not None:
+        del parent[0]
+
+# starsector dir which the catalog maps are currently loaded from
+# the maps only get reloaded for a save from another install, so any number of sectors of the same install can be loaded in one process
+loaded_catalogs_dir = None
+class Sector:
     def __init__(self):
         self.systems = None
         self.planet_types = None
@@ -273,38 +1343,96 @@ class Sector:
         self.name = None
         self.seed = None
         self.modlist = []
+        self.system_tags = {}
+        self.system_fingerprints = {}
+        # starsector dir which the catalogs (hazards, condition and faction names) of the systems came from
+        self.catalogs_dir = None
+        # SectorColumns, SectorIndex and MarketDistances of the systems, set once they are loaded
+        self.columns = None
+        self.index = None
+        self.market_distances = None
+        self.player_loc = None
+        self.min_hazard = None
+        self.max_hazard = None
+        # results of earlier searches, only kept in memory
+        self.query_cache = QueryCache()
+        # QueryPool for parallel searches, started by the first one
+        self.query_pool = None
+        # systems which had to be rebuilt when the sector was loaded with a previous_sector
+        self.changed_systems = None
 
-    def load_from_xml(self, path):
-        global first_time_loading
+    def load_from_xml(self, path, streaming=False, use_snapshot=False, workers=1, progress=None, previous_sector=None, fingerprint_systems=False):
+        # fingerprint_systems keeps a fingerprint of every system, so that a later import can pass this sector as its previous_sector
+        # (always done when importing with a previous_sector)
+        global loaded_catalogs_dir
+        if progress is None:
+            progress = ImportProgress()
+        # the workers of the query pool and the cached search results have the systems which are about to be replaced
+        self.close_query_pool()
+        self.query_cache = QueryCache()
+        # restore the parsed sector from disk if nothing has changed since the last import of this save
+        if use_snapshot:
+            progress.update('checking snapshot')
+            fingerprint = get_save_fingerprint(path)
+            if self.load_snapshot(path, fingerprint, fingerprint_systems or previous_sector is not None):
+                print(f'Restored sector from snapshot of {path.split("/")[-1]}')
+                loaded_catalogs_dir = self.catalogs_dir = get_starsector_dir(path)
+                return
         # get xml tree root
-        campaign_xml_root = self.get_xml_root(path)
+        # when streaming, only the small top level nodes are kept and the systems are read in a second pass
+        if streaming:
+            campaign_xml_root = self.get_xml_header_root(path, progress)
+        else:
+            campaign_xml_root = self.get_xml_root(path, progress)
         # set global hazard map
-        starsector_dir = os.path.dirname(path) + '/../..'
-        if first_time_loading:
-            set_hazard_cond_map(starsector_dir)
-            set_cond_id_name_map(starsector_dir)
-            set_type_id_name_map(starsector_dir)
-            set_faction_id_name_map(starsector_dir)
+        starsector_dir = get_starsector_dir(path)
+        if loaded_catalogs_dir != starsector_dir:
+            progress.update('loading game data')
+            load_catalogs(starsector_dir)
             print('Loaded in installed faction and planet data.')
-            first_time_loading = False
+        self.catalogs_dir = starsector_dir
         # get systems and planets
-        self.systems = self.get_systems_from_xml(campaign_xml_root)
+        # with more than one worker, the systems get built on a pool of processes
+        # systems which are unchanged since previous_sector was loaded (e.g. from an older save of the same campaign) get reused,
+        # as long as it's the same campaign and install (the systems hold hazards and names from the install's catalogs)
+        reusable_systems = None
+        if previous_sector is not None:
+            reusable_systems = {}
+            if previous_sector.seed != self.get_seed(campaign_xml_root):
+                print('Previous sector is from a different campaign, rebuilding all systems')
+            elif previous_sector.catalogs_dir != starsector_dir:
+                print('Previous sector is from a different install, rebuilding all systems')
+            else:
+                reusable_systems = {previous_sector.system_fingerprints[system.id]: system for system in previous_sector.systems if system.id in previous_sector.system_fingerprints}
+        fingerprinted = fingerprint_systems or previous_sector is not None
+        if streaming:
+            self.systems = self.get_systems_from_xml_stream(path, campaign_xml_root, workers, progress, reusable_systems, fingerprinted)
+        else:
+            self.systems = self.get_systems_from_xml(campaign_xml_root, workers, progress, reusable_systems, fingerprinted)
+        progress.update('finishing')
         # calculate stats
         self.planet_types = set()
         self.star_types = set()
         self.all_conditions = set()
         self.all_themes = set()
+        self.columns = SectorColumns(self.systems)
+        self.index = SectorIndex(self.systems, self.columns)
+        self.market_distances = MarketDistances(self.systems, self.columns)
         self.max_system_dist = 0
         self.max_system_planet_num = 0
+        if self.columns.get_system_num():
+            self.max_system_dist = self.columns.system_dists.max()
+            self.max_system_planet_num = int(self.columns.system_planet_nums.max())
+        # hazard range of this sector's planets, 100% if it has none
+        self.min_hazard = self.max_hazard = 1.0
+        if self.columns.get_planet_num():
+            self.min_hazard = float(self.columns.planet_hazards.min())
+            self.max_hazard = float(self.columns.planet_hazards.max())
         for system in self.systems:
-            self.max_system_dist = max(self.max_system_dist, system.dist)
-            self.max_system_planet_num = max(self.max_system_planet_num, system.get_planet_num())
             self.all_themes.update(system.themes)
             for planet in system.planets:
                 self.planet_types.add(planet.type)
                 self.all_conditions.update(planet.conditions)
-                Sector.MIN_HAZARD = min(Sector.MIN_HAZARD, planet.hazard)
-                Sector.MAX_HAZARD = max(Sector.MAX_HAZARD, planet.hazard)
             for star in system.stars:
                 self.star_types.add(star)
         if None in self.all_conditions:
@@ -312,19 +1440,109 @@ class Sector:
         self.name = self.get_save_name(campaign_xml_root)
         self.seed = self.get_seed(campaign_xml_root)
         self.modlist = self.get_modlist(campaign_xml_root)
+        self.player_loc = self.get_player_loc(campaign_xml_root)
+        if previous_sector is not None:
+            print(f'Rebuilt {len(self.changed_systems)} out of {len(self.systems)} systems')
+        if use_snapshot:
+            self.save_snapshot(path, fingerprint)
 
-    def get_xml_root(self, path):
-        tree = etree.parse(path)
+    def load_snapshot(self, path, fingerprint, needs_system_fingerprints=False):
+        snapshot_path = get_snapshot_path(path)
+        # the snapshot's conditions and types get interned while it's unpickled, so none may be left from another install
+        clear_model_registries()
+        try:
+            snapshot = read_pickle(snapshot_path)
+            is_valid = snapshot['version'] == SNAPSHOT_VERSION and snapshot['fingerprint'] == fingerprint
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError, TypeError):
+            is_valid = False
+        if not is_valid:
+            # stale or unreadable snapshot
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
+            return False
+        if needs_system_fingerprints and snapshot['sector']['systems'] and not snapshot['sector']['system_fingerprints']:
+            # made by an import without system fingerprints, it gets replaced by this one
+            return False
+        self.__dict__.update(snapshot['sector'])
+        set_catalog_maps(snapshot['catalog_maps'])
+        register_models(self.systems)
+        return True
+
+    def save_snapshot(self, path, fingerprint):
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'fingerprint': fingerprint,
+            # what changed compared to a previous sector only applies to the import that worked it out
+            'sector': {key: value for key, value in self.__dict__.items() if key not in ('changed_systems', 'query_cache', 'query_pool')},
+            'catalog_maps': get_catalog_maps()
+        }
+        try:
+            write_pickle(get_snapshot_path(path), snapshot)
+        except OSError as e:
+            print(f'Could not save sector snapshot: {e}')
+
+    def get_xml_root(self, path, progress=None):
+        with open_save_file(path, progress, 'reading save') as f:
+            tree = etree.parse(f)
         root = tree.getroot()
         print(f'Loaded XML file structure from {path.split("/")[-1]}')
         return root
 
+    def get_xml_header_root(self, path, progress=None):
+        # stream through the file, keeping only the top level nodes which hold the save info and the system index
+        # everything else gets cleared as soon as it has been parsed so the memory use doesn't grow with the save size
+        root = None
+        depth = 0
+        keep_top_level_node = False
+        with open_save_file(path, progress, 'reading save header') as f:
+            for event, node in etree.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = node
+                    elif depth == 1:
+                        keep_top_level_node = node.tag in XML_HEADER_TAGS
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 0 or keep_top_level_node:
+                    continue
+                if depth == 1:
+                    root.remove(node)
+                else:
+                    clear_xml_node(node)
+        print(f'Loaded XML header nodes from {path.split("/")[-1]}')
+        return root
+
     def get_save_name(self, campaign_xml_root):
         return campaign_xml_root.find('characterData').find('name').text
 
     def get_seed(self, campaign_xml_root):
         return campaign_xml_root.find('seedString').text
 
+    def get_player_loc(self, campaign_xml_root):
+        # player fleet location in ly: the location of the system it's in, or its own location when it's in hyperspace
+        # None if the fleet isn't stored in the save's top level
+        fleet_node = campaign_xml_root.find('playerFleet')
+        if fleet_node is None or fleet_node.get('ref') is not None:
+            print('Could not find the player fleet location')
+            return None
+        if (container_node := fleet_node.find('cL')) is not None:
+            container_id = container_node.get('ref') or container_node.get('z')
+            if (system := self.get_system_by_id(container_id)) is not None:
+                return list(system.loc)
+        location_node = fleet_node.find('loc')
+        if location_node is None:
+            location_node = fleet_node.find('l')
+        try:
+            return [LY_PER_PX*float(coord) for coord in location_node.text.split('|')]
+        except (AttributeError, ValueError):
+            print('Could not find the player fleet location')
+            return None
+
     def get_modlist(self, campaign_xml_root):
         mod_nodes = campaign_xml_root.find('modAndPluginData').find('allModsEverEnabled')
         modlist = []
@@ -336,39 +1554,101 @@ class Sector:
                 continue
         return modlist
 
-    def get_systems_from_xml(self, campaign_xml_root):
+    def get_systems_from_xml(self, campaign_xml_root, workers=1, progress=None, reusable_systems=None, fingerprinted=False):
         # read the system id's listed at top level in the xml
         system_index = campaign_xml_root.find('starSystems')
         system_ids = [system.get('ref') for system in system_index]
-        system_tags = ['s', 'Sstm', 'cL']#, 't']
-        system_nodes = self.get_system_nodes(campaign_xml_root, system_tags, system_ids)
+        # resolve the system refs (and the location refs inside of the systems) through an index built in one pass
+        if progress is not None:
+            progress.update('indexing systems')
+        ref_index = self.get_ref_index(campaign_xml_root, system_ids)
+        system_nodes = self.get_system_nodes(ref_index, system_ids)
+        self.system_tags = self.get_system_tag_counts(system_nodes)
         print(f'Found {len(system_nodes)} out of {len(system_index)} systems')
+        self.print_system_tag_counts()
         # create dict mapping system id (int) to each system (StarSystem)
-        id_system_map = {}
-        for system_node in system_nodes:
-            system = self.get_system_from_xml_node(campaign_xml_root, system_node)
-            id_system_map[system.id] = system
-        if missing_system_ids := [id for id in system_ids if id not in id_system_map]:
-            print(f'Looking for {len(missing_system_ids)} missing systems')
-            missing_system_nodes = self.get_system_nodes(campaign_xml_root, ['*'], missing_system_ids)
-            print(f'Nonstandard system tags: {", ".join([node.tag for node in missing_system_nodes])}')
-            for system_node in missing_system_nodes:
-                system = self.get_system_from_xml_node(campaign_xml_root, system_node)
-                id_system_map[system.id] = system
+        with SystemBuilder(self, workers, len(system_nodes), progress, reusable_systems, fingerprinted) as builder:
+            for system_node in system_nodes:
+                builder.add(ref_index, system_node)
+            id_system_map = {system.id: system for system in builder.finish()}
         print(f"Mapped ID's to systems")
-        return list(id_system_map.values())
-
-    def get_system_nodes(self, campaign_xml_root, system_tags, system_ids):
-        # use search string which includes all of the system id's concatenated together
-        # to search for each of the tag nodes which define the contents of the listed systems
-        hyperspace_node = campaign_xml_root.find('starSystems')
-        id_search_str = '|' + '|'.join(system_ids) + '|'
-        expr = '|'.join([f"//{system_tag}[contains('{id_search_str}', concat('|', @z, '|'))]" for system_tag in system_tags])
-        system_nodes = hyperspace_node.xpath(expr)
-        return system_nodes
-        
-    def get_system_from_xml_node(self, campaign_xml_root, system_node):
-        ly_per_px = 1/2000
+        systems = list(id_system_map.values())
+        self.set_system_fingerprints(builder, systems, reusable_systems)
+        return systems
+
+    def get_ref_index(self, campaign_xml_root, system_ids):
+        # map the xstream z id of every node that gets referenced by a ref attrib elsewhere
+        # (locations in hyperspace and system bodies) to the node, in document order
+        # system bodies are matched on their id instead of their tag, since mods can use nonstandard tags for them
+        system_id_set = set(system_ids)
+        ref_index = {}
+        for node in campaign_xml_root.iter():
+            if (node_id := node.get('z')) is not None and (node_id in system_id_set or node.tag == 'locInHyper'):
+                ref_index[node_id] = node
+        return ref_index
+
+    def get_system_nodes(self, ref_index, system_ids):
+        # standard tags first, then nonstandard ones, both in document order
+        system_id_set = set(system_ids)
+        system_nodes = [node for node_id, node in ref_index.items() if node_id in system_id_set]
+        return sorted(system_nodes, key=lambda node: node.tag not in SYSTEM_TAGS)
+
+    def get_system_tag_counts(self, system_nodes):
+        tag_counts = {}
+        for node in system_nodes:
+            tag_counts[node.tag] = tag_counts.get(node.tag, 0) + 1
+        return tag_counts
+
+    def print_system_tag_counts(self):
+        print(f'System tags: {", ".join([f"{tag} ({num})" for tag, num in self.system_tags.items()])}')
+        if nonstandard_tags := [tag for tag in self.system_tags if tag not in SYSTEM_TAGS]:
+            print(f'Nonstandard system tags: {", ".join(nonstandard_tags)}')
+
+    def get_systems_from_xml_stream(self, path, campaign_xml_header_root, workers=1, progress=None, reusable_systems=None, fingerprinted=False):
+        system_ids = {system.get('ref') for system in campaign_xml_header_root.find('starSystems')}
+        # xstream only references nodes which were written earlier in the file,
+        # so every referenced location has been indexed by the time its system node ends
+        ref_index = {}
+        # sort key of each system node in the order the non streaming loader finds them
+        # (standard tags first, then nonstandard ones, both in document order)
+        system_order = {}
+        system_tags = {}
+        open_system_num = 0
+        with SystemBuilder(self, workers, len(system_ids), progress, reusable_systems, fingerprinted) as builder, open_save_file(path, progress, 'building systems') as f:
+            for event, node in etree.iterparse(f, events=('start', 'end')):
+                node_id = node.get('z')
+                if event == 'start':
+                    if node_id in system_ids:
+                        system_order[node_id] = (node.tag not in SYSTEM_TAGS, len(system_order))
+                        open_system_num += 1
+                    continue
+                if node.tag == 'locInHyper' and node_id is not None:
+                    # indexed nodes stay alive after their parents get cleared, so just don't clear the node itself
+                    ref_index[node_id] = node
+                    continue
+                if node_id in system_ids:
+                    builder.add(ref_index, node)
+                    system_tags[node.tag] = system_tags.get(node.tag, 0) + 1
+                    open_system_num -= 1
+                # nodes inside of a system that isn't finished yet are still needed to build it
+                if open_system_num == 0 and node.getparent() is not None:
+                    clear_xml_node(node)
+            id_system_map = {system.id: system for system in builder.finish()}
+        # report the tags in the same order as the non streaming loader
+        self.system_tags = dict(sorted(system_tags.items(), key=lambda item: item[0] not in SYSTEM_TAGS))
+        print(f'Found {len(id_system_map)} out of {len(system_ids)} systems')
+        self.print_system_tag_counts()
+        print("Mapped ID's to systems")
+        systems = sorted(id_system_map.values(), key=lambda system: system_order[system.id])
+        self.set_system_fingerprints(builder, systems, reusable_systems)
+        return systems
+
+    def set_system_fingerprints(self, builder, systems, reusable_systems):
+        self.system_fingerprints = builder.fingerprints
+        if reusable_systems is not None:
+            self.changed_systems = [system for system in systems if system.id in builder.rebuilt_system_ids]
+
+    def get_system_from_xml_node(self, ref_index, system_node):
         sys_id = system_node.get('z')
         name = system_node.get('dN')
         # read location from the <l> tag
@@ -377,8 +1657,8 @@ class Sector:
         if location_node.text:
             loc_px = location_node.text.split('|')
         else:
-            loc_px = campaign_xml_root.find(f".//locInHyper[@z='{location_node.get('ref')}']").text.split('|')          
-        loc_ly = [ly_per_px*float(coord) for coord in loc_px]
+            loc_px = ref_index[location_node.get('ref')].text.split('|')
+        loc_ly = [LY_PER_PX*float(coord) for coord in loc_px]
         themes = [tag.text for tag in system_node.find('tags')]
         stars = []
         planets = []
@@ -388,11 +1668,7 @@ class Sector:
         # gates?
         salvageables_dict = {}
         system_is_inhabited = False
-        for node in system_node.find('o').find('saved'):
-            try:
-                category_tags = [tag_node.text for tag_node in node.find('tags')]
-            except TypeError:
-                continue
+        for node, category_tags in self.iter_system_contents(system_node):
             if node.tag == 'Plnt':
                 if 'planet' in category_tags:
                     if new_planet := self.get_planet_from_xml_node(node):
@@ -414,7 +1690,7 @@ class Sector:
                             system_is_inhabited = True
                         stations.append(Station(station_id, station_name, population))
                 elif 'salvageable' in category_tags:
-                    salvageable_id = commentjson.loads(node.find('j0').text)['f0']
+                    salvageable_id = get_salvageable_id(node.find('j0').text)
                     if salvageable_id in salvageables_dict:
                         salvageables_dict[salvageable_id] += 1
                     else:
@@ -430,6 +1706,43 @@ class Sector:
                         break
         return StarSystem(sys_id, name, loc_ly, themes, stars, planets, stable_locs, stations, num_jump_points, salvageables_dict, system_is_inhabited)
 
+    def iter_system_contents(self, system_node):
+        # (node, category tags) of each of the things saved in the system
+        for node in system_node.find('o').find('saved'):
+            try:
+                category_tags = [tag_node.text for tag_node in node.find('tags')]
+            except TypeError:
+                continue
+            yield node, category_tags
+
+    def get_updated_system_copy(self, system, system_node):
+        # copy of an unchanged system from an earlier import, with the xstream ids from the newer save
+        system = copy.copy(system)
+        system.id = system_node.get('z')
+        system.planets = [copy.copy(planet) for planet in system.planets]
+        system.stars = [copy.copy(star) for star in system.stars]
+        # same order and filtering as in get_system_from_xml_node
+        planets = iter(system.planets)
+        stars = iter(system.stars)
+        for node, category_tags in self.iter_system_contents(system_node):
+            if node.tag == 'Plnt':
+                if 'planet' in category_tags:
+                    if self.get_named_market_node(node) is not None:
+                        planet = next(planets)
+                        planet.id = node.get('z')
+                        planet.system_id = node.find('cL').get('ref')
+                elif 'star' in category_tags:
+                    star = next(stars)
+                    star.id = node.get('z')
+                    star.system_id = node.find('cL').get('ref')
+        return system
+
+    def get_named_market_node(self, planet_node):
+        # planets without a named market aren't loaded
+        if (market_node := planet_node.find('market')) is not None and market_node.find('name') is not None:
+            return market_node
+        return None
+
     def get_population_from_market_node(self, market_node):
         if (size_node := market_node.find('size')) is not None:
             size = int(size_node.text)
@@ -447,35 +1760,20 @@ class Sector:
     def get_planet_from_xml_node(self, planet_node):
         id = planet_node.get('z')
         system_id = planet_node.find('cL').get('ref')
-        market_node = planet_node.find('market')
-        type_id = planet_node.find('type').text
-        type = Type(type_id, TYPE_ID_TO_NAME_MAP[type_id])
-        if market_node is not None and (name_node := market_node.find('name')) is not None:
-            name = name_node.text
+        type = get_type(planet_node.find('type').text)
+        if (market_node := self.get_named_market_node(planet_node)) is not None:
+            name = market_node.find('name').text
             population = self.get_population_from_market_node(market_node)
             conditions = []
             # if it's uninhabited, it stores the planet conditions in tags inside a <cond> tag
             if (cond_list_node := market_node.find('cond')) is not None:
                 for node in cond_list_node:
-                    cond_id = node.text
-                    hazard = None
-                    res_level = None
-                    if cond_id in HAZARD_COND_MAP:
-                        hazard = HAZARD_COND_MAP[cond_id]
-                    if cond_id in RESOURCE_MAP:
-                        res_level = RESOURCE_MAP[cond_id]
-                    conditions.append(Condition(cond_id, COND_ID_TO_NAME_MAP[cond_id], hazard, res_level))
+                    conditions.append(get_condition(node.text))
             # otherwise it stores conditions in the 'i' attrib of tags inside a <conditions> tag
             else:
                 for node in market_node.find('conditions'):
                     if cond_id := node.get('i'):
-                        hazard = None
-                        res_level = None
-                        if cond_id in HAZARD_COND_MAP:
-                            hazard = HAZARD_COND_MAP[cond_id]
-                        if cond_id in RESOURCE_MAP:
-                            res_level = RESOURCE_MAP[cond_id]
-                        conditions.append(Condition(cond_id, COND_ID_TO_NAME_MAP[cond_id], hazard, res_level))
+                        conditions.append(get_condition(cond_id))
             #is_inhabited = any([condition.id.startswith('population') for condition in conditions])
             return Planet(id, name, type, conditions, system_id, population)
         else:
@@ -484,33 +1782,355 @@ class Sector:
     def get_star_from_xml_node(self, planet_node):
         id = planet_node.get('z')
         system_id = planet_node.find('cL').get('ref')
-        type_id = planet_node.find('type').text
-        type = Type(type_id, TYPE_ID_TO_NAME_MAP[type_id])
+        type = get_type(planet_node.find('type').text)
         return Star(id, type, system_id)
                 
-    def get_matching_systems(self, system_requirement):
+    def get_matching_systems(self, system_requirement, vectorized=False, indexed=False, cached=False, workers=1):
+        # vectorized evaluates the requirement as masks over the columns, indexed only checks the candidates picked by a query plan
+        # with both, the plan is only used if it leaves few enough candidates; all of them give the same result
+        # cached reuses the result of the same search, or narrows down the result of a looser one, from the query cache
+        # workers > 1 checks the systems on a QueryPool of that many processes, when none of the above are used
+        # and there are at least PARALLEL_QUERY_MIN_SYSTEMS systems
+        if cached:
+            cache_key = system_requirement.get_cache_key()
+            if (cached_systems := self.query_cache.get(cache_key)) is not None:
+                return list(cached_systems)
+            looser_systems = self.query_cache.get_looser(cache_key)
+            if looser_systems is not None and (not vectorized or len(looser_systems) <= MAX_INDEXED_CANDIDATE_FRACTION*len(self.systems)):
+                matching_systems = [system for system in looser_systems if system_requirement.check(system)]
+            else:
+                matching_systems = self.get_matching_systems(system_requirement, vectorized, indexed, workers=workers)
+            self.query_cache.add(cache_key, matching_systems)
+            return list(matching_systems)
+        if indexed and self.index is not None:
+            query_plan = self.index.get_query_plan(system_requirement)
+            if not vectorized or query_plan.is_selective(len(self.systems)):
+                return query_plan.get_matching_systems(self.systems)
+        if vectorized and self.columns is not None:
+            return [self.systems[index] for index in np.flatnonzero(system_requirement.get_mask(self.columns))]
+        if workers > 1 and len(self.systems) >= PARALLEL_QUERY_MIN_SYSTEMS:
+            return [self.systems[index] for index in self.get_query_pool(workers).get_matching_system_indexes(system_requirement)]
         matching_systems = []
         for system in self.systems:
             if system_requirement.check(system):
                 matching_systems.append(system)
         return matching_systems
 
+    def get_query_pool(self, workers):
+        if self.query_pool is None or self.query_pool.workers != workers:
+            self.close_query_pool()
+            self.query_pool = QueryPool(self.systems, self.market_distances, workers)
+        return self.query_pool
+
+    def close_query_pool(self):
+        if self.query_pool is not None:
+            self.query_pool.shutdown()
+            self.query_pool = None
+
+    def get_system_by_id(self, system_id):
+        for system in self.systems:
+            if system.id == system_id:
+                return system
+        return None
+
+    def get_system_by_name(self, system_name):
+        for system in self.systems:
+            if system.name == system_name:
+                return system
+        return None
+
+    def get_systems_near(self, loc, radius):
+        # systems at most radius ly away from loc (a system's loc, the player_loc or any other point), in load order
+        return [self.systems[index] for index in self.index.spatial_index.get_within_radius(loc, radius)]
+
+    def get_nearest_systems(self, loc, k, excluded_system=None):
+        # the k systems nearest to loc, nearest first
+        excluded_index = None
+        if excluded_system is not None:
+            excluded_index = self.systems.index(excluded_system)
+        return [self.systems[index] for index in self.index.spatial_index.get_nearest(loc, k, excluded_index)]
+
+    def get_top_systems(self, system_requirement, k=20, score=None, **search_options):
+        # the k matching systems with the highest score (ColonyScore() by default), best first
+        # search_options are passed on to get_matching_systems, scores are worked out for all matches at once
+        if score is None:
+            score = ColonyScore()
+        matching_systems = self.get_matching_systems(system_requirement, **search_options)
+        system_indexes = np.array([self.columns.system_indexes[system.id] for system in matching_systems], dtype=np.int64)
+        scores = score(self.columns, system_indexes)
+        # bounded heap of k, ties go to the system loaded first
+        top_scored_indexes = heapq.nlargest(k, zip(scores.tolist(), (-system_indexes).tolist()))
+        return [(self.systems[-negative_index], system_score) for system_score, negative_index in top_scored_indexes]
+
+    def get_market_distance_req_from_dict(self, req_dict):
+        if unknown_keys := set(req_dict) - set(MARKET_REQ_DICT_KEYS):
+            raise ValueError(f'Unknown market requirement keys: {", ".join(sorted(unknown_keys))}')
+        return self.get_market_distance_req(req_dict.get('faction'), req_dict.get('min_size'), req_dict.get('min_distance'), req_dict.get('max_distance'))
+
+    def get_market_distance_req(self, faction_id=None, min_size=None, min_distance=None, max_distance=None):
+        # e.q. at least 10 ly from any pirate market: ('pirates', min_distance=10)
+        # or within 8 ly of a hegemony core world: ('hegemony', min_size=6, max_distance=8)
+        return MarketDistanceReq(self.market_distances, faction_id, min_size, min_distance, max_distance)
+
+    def get_system_clusters(self, member_reqs, max_distance, covered_planet_reqs=[], anchored=False, max_cluster_num=100, **search_options):
+        # groups of different systems, one matching each of member_reqs (StarSystemReqs or ExpressionReqs), which are all
+        # at most max_distance ly apart from each other (anchored: from the first member's system) and which together have
+        # a planet matching each of covered_planet_reqs, e.q. 3 uninhabited systems within 6 ly with farmland, ore, rare ore and volatiles between them
+        # search_options are passed on to get_matching_systems, which finds the candidates for each member
+        # returns lists of systems in the order of member_reqs, at most max_cluster_num of them (None for all)
+        if not member_reqs:
+            return []
+        system_num = len(self.systems)
+        member_masks = np.zeros((len(member_reqs), system_num), dtype=bool)
+        for member, member_req in enumerate(member_reqs):
+            member_indexes = [self.columns.system_indexes[system.id] for system in self.get_matching_systems(member_req, **search_options)]
+            member_masks[member, member_indexes] = True
+        cover_masks = np.zeros((len(covered_planet_reqs), system_num), dtype=bool)
+        for cover_index, p_req in enumerate(covered_planet_reqs):
+            cover_masks[cover_index] = segment_any(p_req.get_mask(self.columns), self.columns.planet_offsets)
+        member_keys = [member_req.get_cache_key() for member_req in member_reqs]
+        cluster_search = ClusterSearch(self.index.spatial_index, member_masks, cover_masks, member_keys, max_distance, anchored)
+        return [[self.systems[index] for index in cluster] for cluster in cluster_search.get_clusters(max_cluster_num)]
+
     def get_hazard_range(self):
-        return Sector.MIN_HAZARD, Sector.MAX_HAZARD
+        return self.min_hazard, self.max_hazard
+
+    def get_system_req_from_dict(self, req_dict):
+        # StarSystemReq from a REQ_DICT_KEYS dict of plain values (e.q. read from a json file), or ExpressionReq if it has an 'expression'
+        # 'near' is the name of a system of this sector or PLAYER_FLEET_NEAR_VALUE
+        if unknown_keys := set(req_dict) - set(REQ_DICT_KEYS):
+            raise ValueError(f'Unknown system requirement keys: {", ".join(sorted(unknown_keys))}')
+        if 'expression' in req_dict:
+            if other_keys := set(req_dict) - {'name', 'expression'}:
+                raise ValueError(f'An expression requirement can\'t have other keys: {", ".join(sorted(other_keys))}')
+            return ExpressionReq(req_dict['expression'])
+        near_loc = None
+        if (near_value := req_dict.get('near')) is not None:
+            if near_value == PLAYER_FLEET_NEAR_VALUE:
+                near_loc = self.player_loc
+            elif (near_system := self.get_system_by_name(near_value)) is not None:
+                near_loc = near_system.loc
+            if near_loc is None:
+                raise ValueError(f'Could not find the location of {near_value}')
+        return StarSystemReq(
+            max_distance=req_dict.get('max_distance'),
+            min_planet_num=req_dict.get('min_planets'),
+            planet_reqs=[get_planet_req_from_dict(planet_req_dict, self.max_hazard) for planet_req_dict in req_dict.get('planets', [])],
+            must_be_uninhabited=req_dict.get('uninhabited', False),
+            distinct_planets=req_dict.get('distinct_planets', False),
+            market_distance_reqs=[self.get_market_distance_req_from_dict(market_req_dict) for market_req_dict in req_dict.get('markets', [])],
+            desired_theme=req_dict.get('theme'),
+            desired_faction=req_dict.get('faction'),
+            near_loc=near_loc,
+            near_radius=req_dict.get('near_radius', 10) if near_loc is not None else None
+        )
+
+
+# keys of the dicts taken by Sector.get_system_req_from_dict and get_planet_req_from_dict
+REQ_DICT_KEYS = ('name', 'expression', 'max_distance', 'min_planets', 'uninhabited', 'theme', 'faction', 'near', 'near_radius', 'planets', 'distinct_planets', 'markets')
+PLANET_REQ_DICT_KEYS = ('types', 'conditions', 'resources', 'max_hazard', 'exclusive_types', 'exclusive_conditions')
+MARKET_REQ_DICT_KEYS = ('faction', 'min_size', 'min_distance', 'max_distance')
+PLAYER_FLEET_NEAR_VALUE = 'player_fleet'
+
+def get_planet_req_from_dict(req_dict, max_hazard=None):
+    # PlanetReq from a PLANET_REQ_DICT_KEYS dict of ids, the catalogs of the save have to be loaded already
+    # 'resources' are minimum levels (e.q. 'ore_abundant'), 'max_hazard' is in % like in the game
+    if unknown_keys := set(req_dict) - set(PLANET_REQ_DICT_KEYS):
+        raise ValueError(f'Unknown planet requirement keys: {", ".join(sorted(unknown_keys))}')
+    resource_levels = {level.id: level for levels in RESOURCE_LEVEL_LISTS for level in levels}
+    # planets keep their resources apart from their conditions, so a resource under 'conditions' would never match
+    for cond_id in req_dict.get('conditions', []):
+        if cond_id in resource_levels:
+            raise ValueError(f'{cond_id} is a resource, give it under resources instead of conditions')
+    try:
+        desired_types = [get_type(type_id) for type_id in req_dict.get('types', [])]
+        desired_conditions = [get_condition(cond_id) for cond_id in req_dict.get('conditions', [])]
+        desired_resources = [resource_levels[resource_id] for resource_id in req_dict.get('resources', [])]
+    except KeyError as e:
+        raise ValueError(f'Unknown planet type, condition or resource: {e.args[0]}') from None
+    desired_hazard = None
+    if req_dict.get('max_hazard') is not None:
+        desired_hazard = req_dict['max_hazard']/100
+    return PlanetReq(
+        desired_types=desired_types,
+        desired_conditions=desired_conditions,
+        desired_resources=desired_resources,
+        desired_hazard=desired_hazard,
+        exclusive_type_mode=req_dict.get('exclusive_types', False),
+        exclusive_cond_mode=req_dict.get('exclusive_conditions', False),
+        max_hazard=max_hazard
+    )
+
+
+# xstream id attribs, which get left out of system fingerprints
+XSTREAM_ID_ATTRIB_REGEX = re.compile(rb' (?:z|ref)="[^"]*"')
+
+def get_system_fingerprint(ref_index, system_node):
+    # hash of everything a system gets built from, except for the xstream ids
+    # (those are handed out in the order things get written, so they shift between two saves of the same campaign)
+    fingerprint = hashlib.sha1(XSTREAM_ID_ATTRIB_REGEX.sub(b'', etree.tostring(system_node, with_tail=False)))
+    if not (location_node := system_node.find('l')).text:
+        fingerprint.update(ref_index[location_node.get('ref')].text.encode())
+    return fingerprint.digest()
+
+def get_systems_from_xml_strings(system_records):
+    # runs in a worker process of SystemBuilder
+    # each record is a serialized system node, plus the location node it references (if any)
+    sector = Sector()
+    systems = []
+    for system_xml, location_xml in system_records:
+        ref_index = {}
+        if location_xml is not None:
+            location_node = etree.fromstring(location_xml)
+            ref_index[location_node.get('z')] = location_node
+        systems.append(sector.get_system_from_xml_node(ref_index, etree.fromstring(system_xml)))
+    return systems
+
+# systems of the sector searched by a query worker process, see QueryPool
+query_systems = None
+query_market_distances = None
+
+def set_query_systems(systems, catalog_maps, market_distances):
+    # runs once in each worker process of a QueryPool, so that queries don't have to send the systems (or their market distances)
+    global query_systems, query_market_distances
+    set_catalog_maps(catalog_maps)
+    register_models(systems)
+    query_systems = systems
+    query_market_distances = market_distances
+
+def get_query_market_distance_req(faction_id, min_size, min_distance, max_distance):
+    # runs in a worker process of a QueryPool, when a MarketDistanceReq gets unpickled
+    return MarketDistanceReq(query_market_distances, faction_id, min_size, min_distance, max_distance)
+
+def get_matching_system_indexes(system_requirement, start, end):
+    # runs in a worker process of a QueryPool
+    return [system_index for system_index in range(start, end) if system_requirement.check(query_systems[system_index])]
+
+def get_chunk_size(system_num, workers):
+    # a few chunks per worker, so that a chunk with slow systems doesn't leave the other workers idle at the end
+    return max(1, ceil(system_num/(4*workers)))
+
+# below this many systems, sending a query to the worker processes takes longer than checking the systems right away
+PARALLEL_QUERY_MIN_SYSTEMS = 4000
+
+class QueryPool:
+    # worker processes which check the systems of a sector against a requirement, a chunk of the systems each
+    # the systems are handed to each worker once when it starts (forked processes share them with the main process),
+    # after that a query only sends the requirement and the chunk bounds
+    def __init__(self, systems, market_distances, workers):
+        self.system_num = len(systems)
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers, initializer=set_query_systems, initargs=(systems, get_catalog_maps(), market_distances))
+        chunk_size = get_chunk_size(self.system_num, workers)
+        self.chunk_bounds = [(start, min(start + chunk_size, self.system_num)) for start in range(0, self.system_num, chunk_size)]
+
+    def get_matching_system_indexes(self, system_requirement):
+        # merged in chunk order, so the indexes come out ascending like in a serial search
+        starts, ends = zip(*self.chunk_bounds) if self.chunk_bounds else ((), ())
+        chunk_results = self.executor.map(get_matching_system_indexes, [system_requirement]*len(starts), starts, ends)
+        return [system_index for chunk_indexes in chunk_results for system_index in chunk_indexes]
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+class SystemBuilder:
+    # builds systems from their xml nodes, either right away or in chunks on a pool of worker processes
+    # finish() returns the systems in the order they were added, no matter the worker count or chunk size
+    def __init__(self, sector, workers=1, system_num=0, progress=None, reusable_systems=None, fingerprinted=False):
+        self.sector = sector
+        self.workers = workers
+        self.system_num = system_num
+        self.progress = progress
+        # systems from an earlier import, by fingerprint, which get copied instead of rebuilt if the fingerprint matches
+        self.reusable_systems = reusable_systems or {}
+        # fingerprints are only worked out when they get used, since hashing every system slows down the import
+        self.fingerprinted = fingerprinted or bool(self.reusable_systems)
+        self.fingerprints = {}
+        self.rebuilt_system_ids = set()
+        self.systems = []
+        self.executor = None
+        if workers > 1:
+            # the catalog maps are module globals, so every worker gets a copy when it starts
+            self.executor = ProcessPoolExecutor(workers, initializer=set_catalog_maps, initargs=(get_catalog_maps(),))
+            self.chunk_size = get_chunk_size(system_num, workers)
+            self.chunk = []
+            # a reused system, or None where the next system built by the worker goes
+            self.chunk_slots = []
+            self.pending_chunks = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def add(self, ref_index, system_node):
+        system_id = system_node.get('z')
+        reused_system = None
+        earlier_system = None
+        if self.fingerprinted:
+            fingerprint = get_system_fingerprint(ref_index, system_node)
+            self.fingerprints[system_id] = fingerprint
+            earlier_system = self.reusable_systems.get(fingerprint)
+        if earlier_system is not None:
+            reused_system = self.sector.get_updated_system_copy(earlier_system, system_node)
+        else:
+            self.rebuilt_system_ids.add(system_id)
+        if self.executor is None:
+            self.systems.append(reused_system or self.sector.get_system_from_xml_node(ref_index, system_node))
+            self.update_progress()
+            return
+        self.chunk_slots.append(reused_system)
+        if reused_system is None:
+            location_xml = None
+            if not (location_node := system_node.find('l')).text:
+                location_xml = etree.tostring(ref_index[location_node.get('ref')], with_tail=False)
+            self.chunk.append((etree.tostring(system_node, with_tail=False), location_xml))
+        if len(self.chunk_slots) >= self.chunk_size:
+            self.submit_chunk()
+
+    def submit_chunk(self):
+        # don't let serialized chunks pile up in memory when the parser is faster than the workers
+        if len(self.pending_chunks) >= 2*self.workers:
+            self.collect_chunk()
+        self.pending_chunks.append((self.chunk_slots, self.executor.submit(get_systems_from_xml_strings, self.chunk)))
+        self.chunk = []
+        self.chunk_slots = []
+
+    def collect_chunk(self):
+        chunk_slots, future = self.pending_chunks.popleft()
+        built_systems = iter(future.result())
+        self.systems += [system if system is not None else next(built_systems) for system in chunk_slots]
+        self.update_progress()
+
+    def finish(self):
+        if self.executor is not None:
+            if self.chunk_slots:
+                self.submit_chunk()
+            while self.pending_chunks:
+                self.collect_chunk()
+        return self.systems
+
+    def update_progress(self):
+        if self.progress is not None:
+            self.progress.update('building systems', systems_done=len(self.systems), systems_total=self.system_num)
 
 
 class PlanetReq:
     next_id = 0
-    def __init__(self, desired_types=[], desired_conditions=[], desired_resources=[], desired_hazard=None, exclusive_type_mode=False, exclusive_cond_mode=False):
+    def __init__(self, desired_types=[], desired_conditions=[], desired_resources=[], desired_hazard=None, exclusive_type_mode=False, exclusive_cond_mode=False, max_hazard=None):
         self.desired_types = desired_types
         self.desired_conditions = desired_conditions
         self.desired_resources = desired_resources
         if desired_resources:
-            # get better resource levels to match the search (e.q. if 'ore_sparse', search should also match 'ore_rich' etc)
-            self.desired_resources_levels = [self.get_better_resource_levels(desired_resource_level) for desired_resource_level in desired_resources]
+            # searching for e.q. 'ore_sparse' should also match 'ore_rich' etc, so each one is a minimum level of its resource
+            self.desired_resource_minimums = [RESOURCE_FAMILY_LEVEL_MAP[desired_resource_level.id] for desired_resource_level in desired_resources]
         self.desired_hazard = desired_hazard
         self.exclusive_type_mode = exclusive_type_mode
         self.exclusive_cond_mode = exclusive_cond_mode
+        # highest hazard of the sector the req is made for, a desired_hazard at that level isn't worth showing
+        self.max_hazard = max_hazard
         PlanetReq.next_id += 1
         self.id = PlanetReq.next_id 
 
@@ -532,16 +2152,39 @@ class PlanetReq:
         if self.desired_hazard is not None and planet.hazard > self.desired_hazard:
             return False
         if self.desired_resources:
-            if not all([any([level in planet.resources for level in resource_levels]) for resource_levels in self.desired_resources_levels]):
+            if not all([planet.resource_levels[family_index] >= min_level_index for family_index, min_level_index in self.desired_resource_minimums]):
                 return False
         return True
 
-    def get_better_resource_levels(self, desired_resource_level):
-        resource_levels_list = [ORE_LEVELS, RARE_ORE_LEVELS, FARMLAND_LEVELS, ORGANICS_LEVELS, VOLATILES_LEVELS, RUINS_LEVELS]
-        index_of_desired_resource_type = [desired_resource_level in resource_levels for resource_levels in resource_levels_list].index(True)
-        desired_resource_levels = resource_levels_list[index_of_desired_resource_type]
-        index_of_desired_level = desired_resource_levels.index(desired_resource_level)
-        return desired_resource_levels[index_of_desired_level:]
+    def get_cache_key(self):
+        # hashable form of the req, the same for reqs which match the same planets in the same way
+        types = frozenset([type.name for type in self.desired_types])
+        conditions = frozenset([cond.id for cond in self.desired_conditions])
+        resource_minimums = frozenset(self.desired_resource_minimums) if self.desired_resources else frozenset()
+        return (types, bool(types) and self.exclusive_type_mode, conditions, bool(conditions) and self.exclusive_cond_mode, self.desired_hazard, resource_minimums)
+
+    def get_mask(self, columns):
+        # same as check, but for all planets of a SectorColumns at once
+        mask = np.ones(columns.get_planet_num(), dtype=bool)
+        if self.desired_types:
+            type_codes = [columns.type_names.index(type.name) for type in self.desired_types if type.name in columns.type_names]
+            type_mask = np.isin(columns.planet_type_codes, type_codes)
+            mask &= ~type_mask if self.exclusive_type_mode else type_mask
+        if self.desired_conditions:
+            cond_bits, all_found = columns.get_condition_bits([cond.id for cond in self.desired_conditions])
+            matched_bits = columns.planet_condition_bits & cond_bits
+            if self.exclusive_cond_mode:
+                mask &= ~matched_bits.any(axis=1)
+            elif all_found:
+                mask &= (matched_bits == cond_bits).all(axis=1)
+            else:
+                mask[:] = False
+        if self.desired_hazard is not None:
+            mask &= columns.planet_hazards <= self.desired_hazard
+        if self.desired_resources:
+            for family_index, min_level_index in self.desired_resource_minimums:
+                mask &= columns.planet_resource_levels[:, family_index] >= min_level_index
+        return mask
 
     def __repr__(self):
         repr_str = ''
@@ -558,7 +2201,7 @@ class PlanetReq:
                 repr_str +=  'req. conditions'
             else:
                 repr_str += 'excl. conditions'
-        if self.desired_hazard and self.desired_hazard != Sector.MAX_HAZARD:
+        if self.desired_hazard and self.desired_hazard != self.max_hazard:
             if repr_str != '':
                 repr_str += ', '
             repr_str += f'hazard =< {self.desired_hazard*100:0.0f}%'
@@ -573,12 +2216,71 @@ class PlanetReq:
 
 
 class StarSystemReq:
-    def __init__(self, max_distance=None, min_planet_num=None, planet_reqs=[], must_be_uninhabited=False, desired_theme=None):
+    def __init__(self, max_distance=None, min_planet_num=None, planet_reqs=[], must_be_uninhabited=False, desired_theme=None, desired_faction=None, near_loc=None, near_radius=None, distinct_planets=False, market_distance_reqs=[]):
         self.max_distance = max_distance
         self.planet_reqs = planet_reqs
         self.min_planet_num = min_planet_num
         self.must_be_uninhabited = must_be_uninhabited
         self.desired_theme = desired_theme
+        # faction id which has to own a populated planet or station in the system
+        self.desired_faction = desired_faction
+        # point (e.q. a core world's loc or the player_loc) which the system has to be at most near_radius ly away from
+        self.near_loc = near_loc
+        self.near_radius = near_radius
+        # whether every planet req needs a different planet, instead of any planet matching each of them
+        self.distinct_planets = distinct_planets
+        # MarketDistanceReqs made by the sector which is searched
+        self.market_distance_reqs = market_distance_reqs
+
+    def get_cache_key(self):
+        # hashable form of the req (the order of the planet reqs doesn't matter, so they're a set)
+        near = None
+        if self.near_loc is not None:
+            near = (tuple(self.near_loc), self.near_radius)
+        planet_req_keys = frozenset([p_req.get_cache_key() for p_req in self.planet_reqs])
+        if self.distinct_planets:
+            # the same planet req twice needs two planets here, so the keys are counted
+            planet_req_keys = tuple(sorted([p_req.get_cache_key() for p_req in self.planet_reqs], key=repr))
+        market_distance_req_keys = frozenset([market_distance_req.get_cache_key() for market_distance_req in self.market_distance_reqs])
+        return (self.max_distance, self.min_planet_num, self.desired_theme, self.desired_faction, near, self.must_be_uninhabited, self.distinct_planets, market_distance_req_keys, planet_req_keys)
+
+    def get_predicates(self):
+        # (criterion, value, predicate) of each criterion in use, each predicate doing the same as its part of check
+        predicates = []
+        if self.max_distance is not None:
+            predicates.append(('max_distance', self.max_distance, lambda system: not system.dist > self.max_distance))
+        if self.min_planet_num is not None:
+            predicates.append(('min_planet_num', self.min_planet_num, lambda system: len(system.planets) >= self.min_planet_num))
+        if self.desired_theme is not None:
+            predicates.append(('desired_theme', self.desired_theme, lambda system: self.desired_theme in system.themes))
+        if self.desired_faction is not None:
+            predicates.append(('desired_faction', self.desired_faction, lambda system: self.desired_faction in get_system_faction_ids(system)))
+        if self.near_loc is not None:
+            predicates.append(('near_loc', (self.near_loc, self.near_radius), self.is_near))
+        for market_distance_req in self.market_distance_reqs:
+            predicates.append(('market_distance', market_distance_req, market_distance_req.check))
+        # a planet req is fulfilled if any planet of the system matches it
+        for p_req in self.planet_reqs:
+            predicates.append(('planet_req', p_req, lambda system, p_req=p_req: any(p_req.check(planet) for planet in system.planets)))
+        if self.must_be_uninhabited:
+            predicates.append(('must_be_uninhabited', True, lambda system: not system.is_inhabited))
+        if self.distinct_planets and len(self.planet_reqs) > 1:
+            predicates.append(('distinct_planets', True, self.has_distinct_planets))
+        return predicates
+
+    def has_distinct_planets(self, system):
+        # whether each planet req can be matched by a planet of its own
+        req_planet_bits = [0]*len(self.planet_reqs)
+        for planet_index, planet in enumerate(system.planets):
+            for req_index, p_req in enumerate(self.planet_reqs):
+                if p_req.check(planet):
+                    req_planet_bits[req_index] |= 1 << planet_index
+        return has_distinct_matches(req_planet_bits)
+
+    def is_near(self, system):
+        x_offset = system.loc[0] - self.near_loc[0]
+        y_offset = system.loc[1] - self.near_loc[1]
+        return x_offset*x_offset + y_offset*y_offset <= self.near_radius*self.near_radius
 
     def check(self, system):
         if self.max_distance is not None and system.dist > self.max_distance:
@@ -587,6 +2289,13 @@ class StarSystemReq:
             return False
         if self.desired_theme is not None and self.desired_theme not in system.themes:
             return False
+        if self.desired_faction is not None and self.desired_faction not in get_system_faction_ids(system):
+            return False
+        if self.near_loc is not None and not self.is_near(system):
+            return False
+        for market_distance_req in self.market_distance_reqs:
+            if not market_distance_req.check(system):
+                return False
         all_reqs_fulfilled = True
         for p_req in self.planet_reqs:
             req_fulfilled = False
@@ -601,7 +2310,538 @@ class StarSystemReq:
             return False
         if self.must_be_uninhabited and system.is_inhabited:
             return False
+        # only worked out once the cheaper any-planet check has passed
+        if self.distinct_planets and len(self.planet_reqs) > 1 and not self.has_distinct_planets(system):
+            return False
         return True
     
+    def get_mask(self, columns):
+        # same as check, but for all systems of a SectorColumns at once
+        mask = np.ones(columns.get_system_num(), dtype=bool)
+        if self.max_distance is not None:
+            mask &= columns.system_dists <= self.max_distance
+        if self.min_planet_num is not None:
+            mask &= columns.system_planet_nums >= self.min_planet_num
+        if self.desired_theme is not None:
+            mask &= columns.get_system_theme_mask(self.desired_theme)
+        if self.desired_faction is not None:
+            mask &= columns.get_system_faction_mask(self.desired_faction)
+        if self.near_loc is not None:
+            mask &= get_squared_dists(columns.system_locs, self.near_loc) <= self.near_radius*self.near_radius
+        for market_distance_req in self.market_distance_reqs:
+            mask &= market_distance_req.get_mask(columns)
+        # a planet req is fulfilled if any planet of the system matches it
+        planet_req_masks = [p_req.get_mask(columns) for p_req in self.planet_reqs]
+        for planet_req_mask in planet_req_masks:
+            mask &= segment_any(planet_req_mask, columns.planet_offsets)
+        if self.must_be_uninhabited:
+            mask &= ~columns.system_inhabited
+        if self.distinct_planets and len(self.planet_reqs) > 1:
+            mask &= self.get_distinct_planets_mask(columns, planet_req_masks, mask)
+        return mask
+
+    def get_distinct_planets_mask(self, columns, planet_req_masks, mask):
+        # has_distinct_planets for the systems left in the mask, from the planet masks of the planet reqs
+        # systems with fewer planets matching any req than there are reqs can't have distinct ones
+        any_req_mask = np.logical_or.reduce(planet_req_masks)
+        mask = mask & (segment_count(any_req_mask, columns.planet_offsets) >= len(self.planet_reqs))
+        req_planet_masks = np.stack(planet_req_masks)
+        for system_index in np.flatnonzero(mask):
+            start, end = columns.planet_offsets[system_index], columns.planet_offsets[system_index+1]
+            # bit i of a req's int is planet i of the system
+            req_planet_bytes = np.packbits(req_planet_masks[:, start:end], axis=1, bitorder='little')
+            req_planet_bits = [int.from_bytes(planet_bytes.tobytes(), 'little') for planet_bytes in req_planet_bytes]
+            mask[system_index] = has_distinct_matches(req_planet_bits)
+        return mask
+
     def __repr__(self):
         return f'<sys req: at least {self.min_planet_num} planets at least {self.max_distance} from center with {self.planet_reqs}>'
+
+
+# requirement expressions, e.q. '(ore >= abundant or rare_ore >= rich) and not pollution and dist <= 30'
+# system criteria: dist <op> ly, planets <op> n, theme = id, faction = id, inhabited, uninhabited
+# planet criteria: type = id, hazard <op> %, <resource> <op> level (e.q. ore >= abundant, a resource on its own is any level of it,
+# a level id on its own is that level, e.q. ore_rich is ore = rich), and condition ids on their own (e.q. pollution)
+# the largest groups of planet criteria are about one planet, planet(...) starts a group of its own (e.q. planet(farmland) and planet(ore)
+# is a planet with farmland and a planet with ore), but different groups can be met by the same planet
+# ids can have - in them (e.q. type = barren-bombarded)
+EXPRESSION_TOKEN_REGEX = re.compile(r'\s*(?:(<=|>=|!=|[()<>=])|([A-Za-z_][A-Za-z0-9_-]*)|(\d+(?:\.\d*)?|\.\d+))')
+EXPRESSION_OPS = {
+    '<': lambda a, b: a < b, '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+    '=': lambda a, b: a == b, '!=': lambda a, b: a != b
+}
+RESOURCE_FAMILY_NAMES = [levels[0].id.rsplit('_', 1)[0] for levels in RESOURCE_LEVEL_LISTS]
+SYSTEM_NUMBER_CRITERIA = ('dist', 'planets')
+PLANET_CRITERIA = ('type', 'conds_all', 'conds_any', 'hazard', 'resource')
+# rough relative cost of checking each criterion once, the cheap ones get checked first
+EXPRESSION_CRITERION_COSTS = {
+    'dist': 1, 'planets': 1, 'inhabited': 1, 'theme': 2, 'faction': 6,
+    'type': 1, 'hazard': 1, 'conds_all': 2, 'conds_any': 2, 'resource': 2
+}
+# planets checked per planet group, for its cost
+EXPRESSION_PLANETS_PER_SYSTEM = 4
+
+def get_expression_tokens(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = EXPRESSION_TOKEN_REGEX.match(expression, position)
+        if match is None:
+            raise ValueError(f'Unexpected character at {position+1} in expression: {expression[position:position+10]}')
+        op, name, number = match.groups()
+        if name is not None:
+            tokens.append(('name', name.lower() if name.lower() in ('and', 'or', 'not') else name))
+        elif number is not None:
+            tokens.append(('number', float(number)))
+        else:
+            tokens.append(('op', op))
+        position = match.end()
+    return tokens
+
+class ExpressionParser:
+    # recursive descent parser, turns an expression into a tree of tuples
+    # ('and', children), ('or', children), ('not', child), ('planet', child) or a criterion (see parse_criterion)
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = get_expression_tokens(expression)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind is None or (kind is not None and token_kind != kind) or (value is not None and token_value != value):
+            expected = value or kind or 'more'
+            found = 'the end' if token_kind is None else repr(token_value)
+            raise ValueError(f'Expected {expected} but found {found} in expression: {self.expression}')
+        self.position += 1
+        return token_value
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            raise ValueError(f'Unexpected {self.peek()[1]!r} in expression: {self.expression}')
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ('name', 'or'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ('or', tuple(children))
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() == ('name', 'and'):
+            self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else ('and', tuple(children))
+
+    def parse_not(self):
+        if self.peek() == ('name', 'not'):
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        if self.peek() == ('op', '('):
+            self.take()
+            node = self.parse_or()
+            self.take('op', ')')
+            return node
+        name = self.take('name')
+        if name == 'planet' and self.peek() == ('op', '('):
+            self.take()
+            node = self.parse_or()
+            self.take('op', ')')
+            return ('planet', node)
+        return self.parse_criterion(name)
+
+    def parse_criterion(self, name):
+        # ('dist'/'planets', op, number), ('theme'/'faction', id), ('inhabited',),
+        # ('type', type names), ('conds_all'/'conds_any', cond ids), ('hazard', op, hazard), ('resource', family index, min level, max level)
+        if name in ('uninhabited', 'inhabited'):
+            return ('not', ('inhabited',)) if name == 'uninhabited' else ('inhabited',)
+        if name in RESOURCE_FAMILY_NAMES and self.peek()[1] not in EXPRESSION_OPS:
+            return ('resource', RESOURCE_FAMILY_NAMES.index(name), 0, len(RESOURCE_LEVEL_LISTS[RESOURCE_FAMILY_NAMES.index(name)]) - 1)
+        if name not in SYSTEM_NUMBER_CRITERIA + ('theme', 'faction', 'type', 'hazard') and name not in RESOURCE_FAMILY_NAMES:
+            if name in RESOURCE_FAMILY_LEVEL_MAP:
+                # resources aren't among a planet's conditions, so a level on its own (e.q. ore_rich) is the same as ore = rich
+                return self.get_resource_criterion(RESOURCE_FAMILY_NAMES[RESOURCE_FAMILY_LEVEL_MAP[name][0]], '=', name)
+            if name not in COND_ID_TO_NAME_MAP:
+                raise ValueError(f'Unknown condition or criterion in expression: {name}')
+            return ('conds_all', frozenset([name]))
+        op = self.take('op')
+        if op not in EXPRESSION_OPS:
+            raise ValueError(f'Expected a comparison after {name} in expression: {self.expression}')
+        if name in SYSTEM_NUMBER_CRITERIA or name == 'hazard':
+            value = self.take('number')
+            node = (name, op, value/100 if name == 'hazard' else value)
+            return node
+        if op not in ('=', '!='):
+            if name in RESOURCE_FAMILY_NAMES:
+                return self.get_resource_criterion(name, op, self.take('name'))
+            raise ValueError(f'{name} can only be compared with = or != in expression: {self.expression}')
+        value = self.take('name')
+        if name in RESOURCE_FAMILY_NAMES:
+            node = self.get_resource_criterion(name, '=', value)
+        elif name == 'type':
+            if value not in TYPE_ID_TO_NAME_MAP:
+                raise ValueError(f'Unknown planet type in expression: {value}')
+            node = ('type', frozenset([TYPE_ID_TO_NAME_MAP[value]]))
+        else:
+            node = (name, value)
+        return ('not', node) if op == '!=' else node
+
+    def get_resource_criterion(self, family_name, op, level_name):
+        # levels are compared by their index in the family's RESOURCE_LEVEL_LISTS list, NO_RESOURCE_LEVEL if the planet has none of it
+        family_index = RESOURCE_FAMILY_NAMES.index(family_name)
+        level_ids = [level.id for level in RESOURCE_LEVEL_LISTS[family_index]]
+        level_id = level_name if level_name in level_ids else f'{family_name}_{level_name}'
+        if level_id not in level_ids:
+            raise ValueError(f'Unknown {family_name} level in expression: {level_name}')
+        level_index = level_ids.index(level_id)
+        min_level_index, max_level_index = NO_RESOURCE_LEVEL, len(level_ids) - 1
+        if op in ('>=', '>', '='):
+            min_level_index = level_index + (op == '>')
+        if op in ('<=', '<', '='):
+            max_level_index = level_index - (op == '<')
+        if op == '!=':
+            return ('not', ('resource', family_index, level_index, level_index))
+        return ('resource', family_index, min_level_index, max_level_index)
+
+def is_planet_expression(node):
+    if node[0] in ('and', 'or'):
+        return all([is_planet_expression(child) for child in node[1]])
+    if node[0] == 'not':
+        return is_planet_expression(node[1])
+    return node[0] in PLANET_CRITERIA
+
+def get_expression_group(op, children):
+    # flattened and/or of the children, with the criteria which can be checked together merged, in a canonical order
+    flat_children = []
+    for child in children:
+        flat_children.extend(child[1] if child[0] == op else [child])
+    cond_ids = set()
+    type_names = set()
+    merged_children = []
+    for child in flat_children:
+        # all of several conditions is one subset check, any of them one disjoint check, same for types
+        if child[0] == 'conds_all' and (op == 'and' or len(child[1]) == 1):
+            cond_ids.update(child[1])
+        elif child[0] == 'conds_any' and (op == 'or' or len(child[1]) == 1):
+            cond_ids.update(child[1])
+        elif child[0] == 'type' and op == 'or':
+            type_names.update(child[1])
+        elif child not in merged_children:
+            merged_children.append(child)
+    if cond_ids:
+        merged_children.append(('conds_all' if op == 'and' else 'conds_any', frozenset(cond_ids)))
+    if type_names:
+        merged_children.append(('type', frozenset(type_names)))
+    if len(merged_children) == 1:
+        return merged_children[0]
+    return (op, tuple(sorted(merged_children, key=repr)))
+
+def simplify_planet_expression(node):
+    if node[0] in ('and', 'or'):
+        return get_expression_group(node[0], [simplify_planet_expression(child) for child in node[1]])
+    if node[0] == 'not':
+        child = simplify_planet_expression(node[1])
+        return child[1] if child[0] == 'not' else ('not', child)
+    return node
+
+def simplify_expression(node):
+    # system level tree, with the largest groups of planet criteria in planet nodes
+    if is_planet_expression(node):
+        return ('planet', simplify_planet_expression(node))
+    if node[0] == 'planet':
+        if not is_planet_expression(node[1]):
+            raise ValueError('planet(...) can only have planet criteria in it')
+        return ('planet', simplify_planet_expression(node[1]))
+    if node[0] == 'not':
+        child = simplify_expression(node[1])
+        return child[1] if child[0] == 'not' else ('not', child)
+    if node[0] in ('and', 'or'):
+        planet_children = [child for child in node[1] if is_planet_expression(child)]
+        children = [simplify_expression(child) for child in node[1] if not is_planet_expression(child)]
+        if planet_children:
+            children.append(('planet', simplify_planet_expression((node[0], tuple(planet_children)))))
+        return get_expression_group(node[0], children)
+    return node
+
+def get_expression_cost(node):
+    if node[0] in ('and', 'or'):
+        return sum([get_expression_cost(child) for child in node[1]])
+    if node[0] == 'not':
+        return get_expression_cost(node[1])
+    if node[0] == 'planet':
+        return 1 + EXPRESSION_PLANETS_PER_SYSTEM*get_expression_cost(node[1])
+    return EXPRESSION_CRITERION_COSTS[node[0]]
+
+def get_cost_ordered(children):
+    return sorted(children, key=get_expression_cost)
+
+def get_all_predicate(predicates):
+    # the predicates chained with and/or (instead of all/any over a list), so that nothing is checked after the result is known
+    if len(predicates) == 1:
+        return predicates[0]
+    first, rest = predicates[0], get_all_predicate(predicates[1:])
+    return lambda *args: first(*args) and rest(*args)
+
+def get_any_predicate(predicates):
+    if len(predicates) == 1:
+        return predicates[0]
+    first, rest = predicates[0], get_any_predicate(predicates[1:])
+    return lambda *args: first(*args) or rest(*args)
+
+def get_condition_predicate(cond_id):
+    # the planets' conditions are the interned instances, so a planet which has the condition is found by an identity check
+    # (the fallback instance still equals the planets' by id if the registry doesn't have the condition)
+    condition = CONDITION_REGISTRY.get(cond_id) or Condition(cond_id)
+    return lambda planet: condition in planet.conditions
+
+def get_planet_predicate(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        predicates = [get_planet_predicate(child) for child in get_cost_ordered(node[1])]
+        return get_all_predicate(predicates) if kind == 'and' else get_any_predicate(predicates)
+    if kind == 'not':
+        predicate = get_planet_predicate(node[1])
+        return lambda planet: not predicate(planet)
+    if kind == 'type':
+        type_names = node[1]
+        return lambda planet: planet.type.name in type_names
+    if kind == 'conds_all':
+        return get_all_predicate([get_condition_predicate(cond_id) for cond_id in sorted(node[1])])
+    if kind == 'conds_any':
+        return get_any_predicate([get_condition_predicate(cond_id) for cond_id in sorted(node[1])])
+    if kind == 'hazard':
+        op, hazard = EXPRESSION_OPS[node[1]], node[2]
+        return lambda planet: op(planet.hazard, hazard)
+    # resource, the best level of the family (precomputed in planet.resource_levels) has to be in range
+    _, family_index, min_level_index, max_level_index = node
+    if max_level_index == len(RESOURCE_LEVEL_LISTS[family_index]) - 1:
+        if min_level_index == NO_RESOURCE_LEVEL:
+            return lambda planet: True
+        return lambda planet: planet.resource_levels[family_index] >= min_level_index
+    return lambda planet: min_level_index <= planet.resource_levels[family_index] <= max_level_index
+
+def get_system_predicate(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        predicates = [get_system_predicate(child) for child in get_cost_ordered(node[1])]
+        return get_all_predicate(predicates) if kind == 'and' else get_any_predicate(predicates)
+    if kind == 'not':
+        predicate = get_system_predicate(node[1])
+        return lambda system: not predicate(system)
+    if kind == 'planet':
+        planet_predicate = get_planet_predicate(node[1])
+        return lambda system: any(map(planet_predicate, system.planets))
+    if kind == 'dist':
+        op, value = EXPRESSION_OPS[node[1]], node[2]
+        return lambda system: op(system.dist, value)
+    if kind == 'planets':
+        op, value = EXPRESSION_OPS[node[1]], node[2]
+        return lambda system: op(len(system.planets), value)
+    if kind == 'theme':
+        theme = node[1]
+        return lambda system: theme in system.themes
+    if kind == 'faction':
+        faction_id = node[1]
+        return lambda system: faction_id in get_system_faction_ids(system)
+    return lambda system: system.is_inhabited
+
+def get_planet_expression_mask(node, columns):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        children = get_cost_ordered(node[1])
+        mask = get_planet_expression_mask(children[0], columns)
+        for child in children[1:]:
+            # nothing left to narrow down (and) or to add (or)
+            if (kind == 'and' and not mask.any()) or (kind == 'or' and mask.all()):
+                break
+            if kind == 'and':
+                mask &= get_planet_expression_mask(child, columns)
+            else:
+                mask |= get_planet_expression_mask(child, columns)
+        return mask
+    if kind == 'not':
+        return ~get_planet_expression_mask(node[1], columns)
+    if kind == 'type':
+        return np.isin(columns.planet_type_codes, [columns.type_names.index(type_name) for type_name in node[1] if type_name in columns.type_names])
+    if kind in ('conds_all', 'conds_any'):
+        cond_bits, all_found = columns.get_condition_bits(list(node[1]))
+        matched_bits = columns.planet_condition_bits & cond_bits
+        if kind == 'conds_any':
+            return matched_bits.any(axis=1)
+        if not all_found:
+            return np.zeros(columns.get_planet_num(), dtype=bool)
+        return (matched_bits == cond_bits).all(axis=1)
+    if kind == 'hazard':
+        return EXPRESSION_OPS[node[1]](columns.planet_hazards, node[2])
+    _, family_index, min_level_index, max_level_index = node
+    resource_levels = columns.planet_resource_levels[:, family_index]
+    return (resource_levels >= min_level_index) & (resource_levels <= max_level_index)
+
+def get_system_expression_mask(node, columns):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        children = get_cost_ordered(node[1])
+        mask = get_system_expression_mask(children[0], columns)
+        for child in children[1:]:
+            if (kind == 'and' and not mask.any()) or (kind == 'or' and mask.all()):
+                break
+            if kind == 'and':
+                mask &= get_system_expression_mask(child, columns)
+            else:
+                mask |= get_system_expression_mask(child, columns)
+        return mask
+    if kind == 'not':
+        return ~get_system_expression_mask(node[1], columns)
+    if kind == 'planet':
+        return segment_any(get_planet_expression_mask(node[1], columns), columns.planet_offsets)
+    if kind == 'dist':
+        return EXPRESSION_OPS[node[1]](columns.system_dists, node[2])
+    if kind == 'planets':
+        return EXPRESSION_OPS[node[1]](columns.system_planet_nums, node[2])
+    if kind == 'theme':
+        return columns.get_system_theme_mask(node[1])
+    if kind == 'faction':
+        return columns.get_system_faction_mask(node[1])
+    return columns.system_inhabited.copy()
+
+class ExpressionReq:
+    # requirement given as an expression (see EXPRESSION_TOKEN_REGEX), can be searched for like a StarSystemReq
+    # the expression is parsed and compiled into a predicate once, the catalogs of the save have to be loaded already
+    def __init__(self, expression):
+        self.expression = expression
+        self.tree = simplify_expression(ExpressionParser(expression).parse())
+        self.predicate = get_system_predicate(self.tree)
+
+    def check(self, system):
+        return self.predicate(system)
+
+    def get_mask(self, columns):
+        return get_system_expression_mask(self.tree, columns)
+
+    def get_predicates(self):
+        # the top level criteria which a query plan can pick candidates for, everything else as one predicate
+        children = self.tree[1] if self.tree[0] == 'and' else (self.tree,)
+        predicates = []
+        other_children = []
+        # the planner's criteria are inclusive, so a strict bound only gets one if it can be made inclusive exactly
+        # (planets > 2 is planets >= 3, but dist < 30 and planets > 2.5 stay in the expression)
+        for child in children:
+            if child[0] == 'dist' and child[1] == '<=':
+                predicates.append(('max_distance', child[2], get_system_predicate(child)))
+            elif child[0] == 'planets' and (child[1] == '>=' or (child[1] == '>' and child[2].is_integer())):
+                predicates.append(('min_planet_num', child[2] + (child[1] == '>'), get_system_predicate(child)))
+            elif child[0] in ('theme', 'faction'):
+                predicates.append((f'desired_{child[0]}', child[1], get_system_predicate(child)))
+            elif child == ('not', ('inhabited',)):
+                predicates.append(('must_be_uninhabited', True, get_system_predicate(child)))
+            else:
+                other_children.append(child)
+        if other_children:
+            other_tree = get_expression_group('and', other_children)
+            predicates.append(('expression', other_tree, get_system_predicate(other_tree)))
+        return predicates
+
+    def get_cache_key(self):
+        # the simplified tree is the same for expressions which only differ in order/spacing/grouping
+        return ('expression', self.tree)
+
+    def __reduce__(self):
+        # the compiled predicate can't be pickled (e.q. for a QueryPool), so it gets compiled again from the expression
+        return (ExpressionReq, (self.expression,))
+
+    def __repr__(self):
+        return f'<expression req: {self.expression}>'
+
+
+class SaveScanResult:
+    # picklable summary of one save scanned by scan_saves
+    def __init__(self, path, name=None, seed=None, system_num=0, req_results=None, error=None):
+        self.path = path
+        self.name = name
+        self.seed = seed
+        self.system_num = system_num
+        # (req name, number of matching systems, [(system name, system id, score)] best first, error) of each req dict
+        # error is None, or why the req couldn't be used for this save (e.q. it's near a system the save doesn't have)
+        self.req_results = req_results if req_results is not None else []
+        self.error = error
+
+    def get_rank_score(self):
+        # seeds are ranked by the sum of the best score for each req, a req without matches adds nothing
+        # and neither does one whose best match has no score (e.q. -inf from ColonyScore for a system without planets)
+        # failed saves go last
+        if self.error is not None:
+            return -np.inf
+        return sum([top_systems[0][2] for _, _, top_systems, _ in self.req_results if top_systems and isfinite(top_systems[0][2])])
+
+    def __repr__(self):
+        return f'<{self.seed} ({self.name}): {self.get_rank_score():0.2f}>'
+
+def get_save_paths(save_dir):
+    # campaign.xml (or compressed campaign.xml) of each save folder in save_dir, and zipped save folders
+    save_paths = sorted(glob.glob(os.path.join(save_dir, '*', 'campaign.xml*')))
+    save_paths += sorted(glob.glob(os.path.join(save_dir, '*.zip')))
+    return save_paths
+
+@contextmanager
+def kept_catalogs():
+    # the catalog maps are module globals, so loading a save from another install replaces them for the whole process
+    # this puts back the ones (and the shared instances made from them) that were loaded before the block, if any
+    global loaded_catalogs_dir
+    catalogs_dir = loaded_catalogs_dir
+    catalog_maps = {key: dict(catalog_map) for key, catalog_map in get_catalog_maps().items()}
+    condition_registry, type_registry = dict(CONDITION_REGISTRY), dict(TYPE_REGISTRY)
+    try:
+        yield
+    finally:
+        if catalogs_dir is not None and loaded_catalogs_dir != catalogs_dir:
+            set_catalog_maps(catalog_maps)
+            CONDITION_REGISTRY.update(condition_registry)
+            TYPE_REGISTRY.update(type_registry)
+            loaded_catalogs_dir = catalogs_dir
+
+def scan_save(path, req_dicts, k=5, use_snapshot=False, score=None):
+    # loads the save into a Sector of its own and returns the k best systems for each of the (name, req dict) pairs
+    # runs in the worker processes of scan_saves, where the console output of loading would get mixed up between saves
+    # with a single worker it runs in the calling process, whose catalogs are kept as they were
+    sector = Sector()
+    with kept_catalogs():
+        try:
+            with redirect_stdout(io.StringIO()):
+                sector.load_from_xml(path, streaming=True, use_snapshot=use_snapshot)
+            req_results = []
+            for req_name, req_dict in req_dicts:
+                try:
+                    system_requirement = sector.get_system_req_from_dict(req_dict)
+                except ValueError as e:
+                    req_results.append((req_name, 0, [], str(e)))
+                    continue
+                # cached, so that counting the matches doesn't search again
+                top_systems = sector.get_top_systems(system_requirement, k, score, vectorized=True, indexed=True, cached=True)
+                match_num = len(sector.get_matching_systems(system_requirement, vectorized=True, indexed=True, cached=True))
+                req_results.append((req_name, match_num, [(system.name, system.id, system_score) for system, system_score in top_systems], None))
+        except Exception as e:
+            # one broken save shouldn't stop the whole batch
+            return SaveScanResult(path, error=f'{type(e).__name__}: {e}')
+        return SaveScanResult(path, sector.name, sector.seed, len(sector.systems), req_results)
+
+def scan_saves(save_paths, req_dicts, workers=None, k=5, use_snapshot=False, score=None):
+    # yields the SaveScanResult of each save as soon as it's scanned, so in the order the saves finish
+    # each save gets loaded into its own Sector, with workers > 1 on a pool of processes (os.cpu_count() of them if None)
+    req_dicts = [(req_dict.get('name', f'req {req_index+1}'), req_dict) for req_index, req_dict in enumerate(req_dicts)]
+    if workers == 1:
+        for path in save_paths:
+            yield scan_save(path, req_dicts, k, use_snapshot, score)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_save, path, req_dicts, k, use_snapshot, score) for path in save_paths]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,6 +1,5 @@
 import PySimpleGUI as sg
 from math import ceil
-from numpy.linalg import norm
 from random import sample
 
 # star drawing sizes
@@ -41,6 +40,9 @@ STAR_DRAW_PARAMS = {
     'istl_sigmaworld':[SIZE_NORMAL, 'limegreen'],
 }
 
+# systems this close (in ly) to the selected one can get labeled
+NEIGHBORHOOD_RADIUS = 5
+
 def round_up_to_multiple_of_n(num, n):
     return ceil(num/n)*n
 
@@ -89,23 +91,19 @@ def draw_stars(starmap_graph, systems, canvas_size):
             # default star
             starmap_graph.draw_circle(*([(x,y)] + STAR_DRAW_PARAMS['star_yellow']))
 
-def draw_labels(starmap_graph, systems, selected_system, canvas_size):
+def draw_labels(starmap_graph, systems, selected_system, canvas_size, nearby_systems):
+    # nearby_systems are the systems within NEIGHBORHOOD_RADIUS of the selected one (from the sector's spatial index)
     padding = canvas_size/50
     font = f'Helvetica {max(int(120/canvas_size), 11)}'
     color = 'white'
     secondary_font = f'Helvetica {max(int(100/canvas_size), 8)}'
     secondary_color = '#3344ff'
-    neighborhood_radius = 5
-    neighboring_systems = []
     for system in systems:
-        if system != selected_system:
+        if system != selected_system and system.is_inhabited:
             x, y = system.loc
-            distance_to_selected = norm((system.loc[0] - selected_system.loc[0], system.loc[1] - selected_system.loc[1]))
-            if system.is_claimed:
-                starmap_graph.draw_line((x, y), [coord+padding for coord in (x, y)], secondary_color, 1)
-                starmap_graph.draw_text(system.name.removesuffix(' Star System'), [coord+padding for coord in (x, y)], secondary_color, secondary_font + ' italic', text_location=sg.TEXT_LOCATION_LEFT)
-            elif distance_to_selected < neighborhood_radius:
-                neighboring_systems.append(system)
+            starmap_graph.draw_line((x, y), [coord+padding for coord in (x, y)], secondary_color, 1)
+            starmap_graph.draw_text(system.name.removesuffix(' Star System'), [coord+padding for coord in (x, y)], secondary_color, secondary_font + ' italic', text_location=sg.TEXT_LOCATION_LEFT)
+    neighboring_systems = [system for system in nearby_systems if system != selected_system and not system.is_inhabited]
     for neighbor in sample(neighboring_systems, min(len(neighboring_systems), 4)):
         x, y = neighbor.loc
         starmap_graph.draw_line((x, y), [coord+padding for coord in (x, y)], secondary_color, 1)
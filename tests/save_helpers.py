@@ -0,0 +1,113 @@
+import json
+import os
+import random
+
+
+# made up game data and saves, with the different ways systems, locations and markets show up in real campaign.xml files
+CONDITION_IDS = ['hot', 'cold', 'habitable', 'extreme_weather', 'mild_climate', 'no_atmosphere', 'pollution', 'low_gravity', 'mod_cond']
+RESOURCE_IDS = ['ore_sparse', 'ore_abundant', 'rare_ore_rich', 'farmland_poor', 'organics_common', 'volatiles_plentiful', 'ruins_vast']
+TYPE_NAMES = {'barren': 'Barren', 'desert': 'Desert', 'terran': 'Terran', 'gas_giant': 'Gas Giant', 'star_yellow': 'Yellow Star', 'star_red_dwarf': 'Red Dwarf'}
+FACTION_IDS = ['hegemony', 'pirates', 'modfac', 'unknownfac']
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def make_install(root):
+    core_dir = f'{root}/starsector-core/data'
+    write_file(f'{core_dir}/campaign/procgen/condition_gen_data.csv',
+               'id,hazard,group\nhot,0.25,t\ncold,0.25,t\nhabitable,-0.25,h\nextreme_weather,0.25,w\nmild_climate,-0.25,w\nno_atmosphere,0.5,a\npollution,0.25,p\nore_sparse,,o\n')
+    write_file(f'{core_dir}/campaign/market_conditions.csv',
+               'id,name,desc\n' + ''.join([f'{cond_id},{cond_id.replace("_", " ").title()},x\n' for cond_id in CONDITION_IDS[:-1] + RESOURCE_IDS]))
+    write_file(f'{core_dir}/world/factions/factions.csv', 'faction\ndata/world/factions/hegemony.faction\ndata/world/factions/pirates.faction\n')
+    write_file(f'{core_dir}/world/factions/hegemony.faction', '{\n  id:"hegemony", # the heg\n  "displayName":"Hegemony",\n  "colors":[1,2,3,],\n}\n')
+    write_file(f'{core_dir}/world/factions/pirates.faction', '{\n\t"id":"pirates",\n\t"displayName":"Pirates",\n\t"music":{"theme":"x",},\n}')
+    write_file(f'{core_dir}/config/planets.json', '{\n' + ',\n'.join([f'  "{type_id}":{{"name":"{name}", # c\n "x":1}}' for type_id, name in TYPE_NAMES.items()]) + '\n}\n')
+    mod_dir = f'{root}/mods/mod/data'
+    write_file(f'{mod_dir}/campaign/market_conditions.csv', 'id,name\nmod_cond,Mod Cond\n')
+    write_file(f'{mod_dir}/config/planets.json', '{"mod_world":{"name":"Mod World"}}')
+    write_file(f'{mod_dir}/world/factions/factions.csv', 'faction\ndata/world/factions/modfac.faction\n')
+    write_file(f'{mod_dir}/world/factions/modfac.faction', '{\n  id:"modfac",\n  displayName:"Mod Faction",\n}')
+    write_file(f'{root}/mods/enabled_mods.json', json.dumps({'enabledMods': ['mod']}))
+
+def make_system_xml(rnd, system_id, system_index, loc_id, next_id):
+    parts = []
+    # locations are either references to the hyperspace anchors or written out in place
+    if rnd.random() < 0.5:
+        parts.append(f'<l ref="{loc_id}"/>')
+    else:
+        parts.append(f'<l>{rnd.uniform(-90000, 90000):.3f}|{rnd.uniform(-90000, 90000):.3f}</l>')
+    themes = rnd.sample(['theme_core', 'theme_ruins', 'theme_remnant', 'procgen_no_theme'], rnd.randint(0, 2))
+    parts.append('<tags>' + ''.join([f'<st>{theme}</st>' for theme in themes]) + '</tags><o><saved>')
+    parts.append(f'<Plnt z="{next_id()}"><tags><st>star</st></tags><cL ref="{system_id}"/><type>{rnd.choice(["star_yellow", "star_red_dwarf"])}</type></Plnt>')
+    planet_type_ids = [type_id for type_id in TYPE_NAMES if not type_id.startswith('star')] + ['mod_world']
+    for planet_index in range(rnd.randint(0, 6)):
+        cond_ids = list(dict.fromkeys(rnd.sample(CONDITION_IDS, rnd.randint(0, 3)) + [rnd.choice(RESOURCE_IDS) for _ in range(rnd.randint(0, 2))]))
+        market = ''
+        if rnd.random() < 0.15:
+            market = (f'<market><name>P{system_index}_{planet_index}</name><size>{rnd.randint(3, 7)}</size><factionId>{rnd.choice(FACTION_IDS)}</factionId>'
+                      '<conditions>' + ''.join([f'<MC i="{cond_id}"/>' for cond_id in cond_ids]) + '<MC/></conditions></market>')
+        elif rnd.random() < 0.9:
+            market = f'<market><name>P{system_index}_{planet_index}</name><cond>' + ''.join([f'<st>{cond_id}</st>' for cond_id in cond_ids]) + '</cond></market>'
+        parts.append(f'<Plnt z="{next_id()}"><tags><st>planet</st></tags><cL ref="{system_id}"/><type>{rnd.choice(planet_type_ids)}</type>{market}</Plnt>')
+    for _ in range(rnd.randint(0, 2)):
+        parts.append(f'<JumpPoint z="{next_id()}"><tags><st>jump_point</st></tags></JumpPoint>')
+    for _ in range(rnd.randint(0, 2)):
+        makeshift = '<st>makeshift</st>' if rnd.random() < 0.5 else ''
+        parts.append(f'<CCEnt z="{next_id()}"><tags><st>{rnd.choice(["comm_relay", "nav_buoy", "stable_location"])}</st>{makeshift}</tags></CCEnt>')
+    for _ in range(rnd.randint(0, 2)):
+        salvageable_id = rnd.choice(['derelict_probe', 'station_research', 'orbital_habitat'])
+        parts.append(f'<CCEnt z="{next_id()}"><tags><st>salvageable</st></tags><j0>{{"f0":"{salvageable_id}",# c\n"f1":[1,2,]}}</j0></CCEnt>')
+    if rnd.random() < 0.1:
+        parts.append(f'<CCEnt z="{next_id()}"><tags><st>station</st></tags><market><id>st{system_index}</id><name>Station {system_index}</name>'
+                     f'<size>{rnd.randint(2, 5)}</size><factionId>{rnd.choice(FACTION_IDS)}</factionId></market></CCEnt>')
+    parts.append('<CCEnt z="0"><notags/></CCEnt></saved></o>')
+    # systems are saved under whatever tag their class got aliased to
+    tag = rnd.choice(['Sstm', 'Sstm', 's', 'cL'])
+    return f'<{tag} z="{system_id}" dN="System {system_index} Star System">' + ''.join(parts) + f'</{tag}>'
+
+def make_save(root, system_num=150, seed=1):
+    # writes an install with a save at <root>/saves/save/campaign.xml and returns the save's path
+    make_install(root)
+    rnd = random.Random(seed)
+    last_id = [1000]
+    def next_id():
+        last_id[0] += 1
+        return str(last_id[0])
+    lines = ['<CampaignEngine z="1">', f'<seedString>CSEED-{seed}</seedString>', '<characterData z="2"><name>Commander</name></characterData>',
+             '<modAndPluginData><allModsEverEnabled><EnabledModData><spec><id>mod</id></spec></EnabledModData></allModsEverEnabled></modAndPluginData>',
+             '<hyperspace z="3"><o><saved>']
+    loc_ids = []
+    for _ in range(system_num):
+        loc_ids.append(next_id())
+        lines.append(f'<HyperAnchor z="{next_id()}"><locInHyper z="{loc_ids[-1]}">{rnd.uniform(-90000, 90000):.3f}|{rnd.uniform(-90000, 90000):.3f}</locInHyper></HyperAnchor>')
+    lines.append('</saved></o></hyperspace><sectorData z="4">')
+    system_ids = []
+    host_line_indexes = []
+    for system_index in range(system_num):
+        system_ids.append(next_id())
+        system_xml = make_system_xml(rnd, system_ids[-1], system_index, loc_ids[system_index], next_id)
+        # now and then a system is first saved inside of the jump point of another one
+        if host_line_indexes and rnd.random() < 0.3:
+            host_line_index = host_line_indexes.pop()
+            jump_point = f'<JumpPoint z="{next_id()}"><tags><st>jump_point</st></tags><dest>{system_xml}</dest></JumpPoint>'
+            lines[host_line_index] = lines[host_line_index].replace('</saved></o>', jump_point + '</saved></o>', 1)
+        else:
+            lines.append(system_xml)
+            host_line_indexes.append(len(lines) - 1)
+    lines.append('</sectorData><starSystems>' + ''.join([f'<Sstm ref="{system_id}"/>' for system_id in system_ids]) + '</starSystems></CampaignEngine>')
+    path = f'{root}/saves/save/campaign.xml'
+    write_file(path, '\n'.join(lines))
+    return path
+
+def get_sector_dump(sector):
+    # everything the loaders read from a save, in a form that can be compared
+    systems = []
+    for system in sector.systems:
+        planets = [(planet.id, planet.name, planet.type.id, sorted([cond.id for cond in planet.conditions + planet.resources]), planet.hazard,
+                    repr(planet.population)) for planet in system.planets]
+        stations = [(station.id, station.name, repr(station.population)) for station in system.stations or []]
+        systems.append((system.id, system.name, system.loc, sorted(system.themes or []), [repr(star.type) for star in system.stars], planets,
+                        stations, repr(system.stable_locs), system.num_jump_points, system.salvageables_dict, system.is_inhabited))
+    return sector.name, sector.seed, sorted(systems)
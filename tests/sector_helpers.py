@@ -0,0 +1,73 @@
+import sectordex_lib as lib
+
+
+# made up conditions, types, themes and factions for random sectors
+HAZARD_CONDITIONS = {'hot': 0.25, 'cold': 0.25, 'toxic_atmosphere': 0.5, 'extreme_tectonic_activity': 0.5}
+OTHER_CONDITIONS = ['pollution', 'low_gravity', 'habitable']
+TYPE_IDS = ['barren', 'desert', 'terran', 'gas_giant', 'barren-bombarded']
+THEMES = ['theme_ruins', 'theme_remnant', 'theme_derelict']
+FACTION_IDS = ['hegemony', 'pirates', 'tritachyon']
+
+def make_condition(cond_id):
+    resource_level = 1 if cond_id in lib.RESOURCE_FAMILY_LEVEL_MAP else None
+    return lib.intern_condition(cond_id, cond_id, HAZARD_CONDITIONS.get(cond_id), resource_level)
+
+def make_planet(planet_id, system_id, cond_ids=(), type_id='barren', population=None):
+    # conditions and types are made up on the spot, so no game data is needed
+    conditions = [make_condition(cond_id) for cond_id in cond_ids]
+    return lib.Planet(planet_id, planet_id, lib.intern_type(type_id, type_id.replace('-', ' ').title()), conditions, system_id, population)
+
+def make_system(system_id, loc, planet_cond_ids=(), is_inhabited=False):
+    planets = [make_planet(f'{system_id}_{planet_index}', system_id, cond_ids) for planet_index, cond_ids in enumerate(planet_cond_ids)]
+    return lib.StarSystem(system_id, system_id, loc, themes=[], planet_list=planets, stations=[], is_inhabited=is_inhabited)
+
+def make_random_planet(rnd, planet_id, system_id):
+    cond_ids = rnd.sample(sorted(HAZARD_CONDITIONS) + OTHER_CONDITIONS, rnd.randint(0, 3))
+    for levels in lib.RESOURCE_LEVEL_LISTS:
+        if rnd.random() < 0.3:
+            cond_ids.append(rnd.choice(levels).id)
+    population = None
+    if rnd.random() < 0.1:
+        faction_id = rnd.choice(FACTION_IDS)
+        population = lib.Population(rnd.randint(3, 7), faction_id, faction_id.title())
+    return make_planet(planet_id, system_id, cond_ids, rnd.choice(TYPE_IDS), population)
+
+def make_random_system(rnd, system_id, size=40):
+    # locations on a half ly grid, so that distances often land right on a search's limit
+    loc = (rnd.randint(-2*size, 2*size)/2, rnd.randint(-2*size, 2*size)/2)
+    planets = [make_random_planet(rnd, f'{system_id}_{planet_index}', system_id) for planet_index in range(rnd.randint(0, 5))]
+    is_inhabited = any([planet.population is not None for planet in planets])
+    return lib.StarSystem(system_id, system_id, loc, themes=rnd.sample(THEMES, rnd.randint(0, 2)), planet_list=planets, stations=[], is_inhabited=is_inhabited)
+
+def make_sector(systems):
+    # the parts of Sector.load_from_xml that searches need
+    sector = lib.Sector()
+    sector.systems = systems
+    sector.columns = lib.SectorColumns(systems)
+    sector.index = lib.SectorIndex(systems, sector.columns)
+    sector.market_distances = lib.MarketDistances(systems, sector.columns)
+    return sector
+
+def make_random_sector(rnd, system_num=300):
+    return make_sector([make_random_system(rnd, f's{system_index}') for system_index in range(system_num)])
+
+def make_random_planet_req(rnd):
+    # few choices for each part, so that some reqs come out tighter than others
+    types = [lib.intern_type(type_id, type_id.replace('-', ' ').title()) for type_id in rnd.sample(TYPE_IDS, rnd.choice([0, 0, 1, 2, 3]))]
+    conditions = [make_condition(cond_id) for cond_id in rnd.sample(sorted(HAZARD_CONDITIONS) + OTHER_CONDITIONS, rnd.choice([0, 0, 1, 2]))]
+    resources = [rnd.choice(levels[:3]) for levels in rnd.sample(lib.RESOURCE_LEVEL_LISTS[:3], rnd.choice([0, 0, 1, 2]))]
+    return lib.PlanetReq(types, conditions, resources, rnd.choice([None, None, 1.0, 1.25, 1.5]), rnd.random() < 0.3, rnd.random() < 0.3)
+
+def make_random_system_req(rnd, sector, planet_req_pool=None):
+    planet_reqs = [rnd.choice(planet_req_pool) if planet_req_pool else make_random_planet_req(rnd) for _ in range(rnd.choice([0, 0, 1, 1, 2, 3]))]
+    market_distance_reqs = []
+    if rnd.random() < 0.2:
+        market_distance_reqs.append(sector.get_market_distance_req(rnd.choice([None] + FACTION_IDS), rnd.choice([None, 4, 6]),
+                                                                   rnd.choice([None, 5, 10]), rnd.choice([None, 15, 30])))
+    near_loc, near_radius = None, None
+    if rnd.random() < 0.2:
+        near_loc, near_radius = (0.0, 0.0), rnd.choice([10, 20, 30])
+    return lib.StarSystemReq(max_distance=rnd.choice([None, None, 20, 30.5, 45]), min_planet_num=rnd.choice([None, None, 1, 2, 3]),
+                             planet_reqs=planet_reqs, must_be_uninhabited=rnd.random() < 0.3, desired_theme=rnd.choice([None, None, None] + THEMES),
+                             desired_faction=rnd.choice([None]*6 + FACTION_IDS), near_loc=near_loc, near_radius=near_radius,
+                             distinct_planets=rnd.random() < 0.3, market_distance_reqs=market_distance_reqs)
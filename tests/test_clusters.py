@@ -0,0 +1,22 @@
+import sectordex_lib as lib
+from sector_helpers import make_sector, make_system
+
+
+def get_cluster_ids(sector, member_reqs, max_distance, anchored):
+    return [[system.id for system in cluster] for cluster in sector.get_system_clusters(member_reqs, max_distance, anchored=anchored, max_cluster_num=None)]
+
+def test_anchored_members_with_the_same_req():
+    # only the middle system has both others within 6 ly
+    sector = make_sector([make_system(f's{x}', (float(x), 0.0)) for x in (0, 5, 10)])
+    system_req = lib.StarSystemReq()
+    assert get_cluster_ids(sector, [system_req]*3, 6, anchored=True) == [['s5', 's0', 's10']]
+    assert get_cluster_ids(sector, [system_req]*2, 6, anchored=True) == [['s0', 's5'], ['s5', 's0'], ['s5', 's10'], ['s10', 's5']]
+    assert get_cluster_ids(sector, [system_req]*3, 6, anchored=False) == []
+    assert get_cluster_ids(sector, [system_req]*3, 10, anchored=False) == [['s0', 's5', 's10']]
+
+def test_anchor_with_its_own_req():
+    sector = make_sector([make_system(f's{x}', (float(x), 0.0), [()]*(x == 5)) for x in (0, 5, 10)])
+    with_planets, any_system = lib.StarSystemReq(min_planet_num=1), lib.StarSystemReq()
+    assert get_cluster_ids(sector, [with_planets, any_system, any_system], 6, anchored=True) == [['s5', 's0', 's10']]
+    assert get_cluster_ids(sector, [any_system, with_planets, any_system], 6, anchored=True) == []
+    assert get_cluster_ids(sector, [any_system, with_planets], 6, anchored=True) == [['s0', 's5'], ['s10', 's5']]
@@ -0,0 +1,41 @@
+import itertools
+import random
+import pytest
+import sectordex_lib as lib
+from sector_helpers import make_random_planet_req, make_random_sector
+
+
+def has_distinct_matches_brute_force(req_planet_bits, planet_num):
+    return any([all([req_planet_bits[req_index] >> planet_index & 1 for req_index, planet_index in enumerate(planet_indexes)])
+                for planet_indexes in itertools.permutations(range(planet_num), len(req_planet_bits))])
+
+def test_matching_matches_brute_force():
+    rnd = random.Random(1)
+    found_num = 0
+    for _ in range(2000):
+        planet_num = rnd.randint(0, 6)
+        req_planet_bits = [rnd.getrandbits(planet_num) if planet_num else 0 for _ in range(rnd.randint(1, 5))]
+        expected = has_distinct_matches_brute_force(req_planet_bits, planet_num)
+        found_num += expected
+        assert lib.has_distinct_matches(req_planet_bits) == expected, req_planet_bits
+    assert 100 < found_num < 1900
+
+def test_augmenting_path_is_needed():
+    # req 0 can take either planet, req 1 only planet 0, so req 0 has to move over
+    assert lib.has_distinct_matches([0b11, 0b01])
+    assert not lib.has_distinct_matches([0b01, 0b01])
+    assert not lib.has_distinct_matches([0b111, 0b011, 0b011, 0b011])
+
+@pytest.fixture(scope='module')
+def sector():
+    return make_random_sector(random.Random(2))
+
+@pytest.mark.parametrize('search_options', [{}, {'vectorized': True}, {'indexed': True}])
+def test_distinct_planet_search_matches_brute_force(sector, search_options):
+    rnd = random.Random(3)
+    for _ in range(60):
+        planet_reqs = [make_random_planet_req(rnd) for _ in range(rnd.randint(1, 3))]
+        system_req = lib.StarSystemReq(planet_reqs=planet_reqs, distinct_planets=True)
+        expected = [system for system in sector.systems if any([all([p_req.check(planet) for p_req, planet in zip(planet_reqs, planets)])
+                                                                for planets in itertools.permutations(system.planets, len(planet_reqs))])]
+        assert sector.get_matching_systems(system_req, **search_options) == expected
@@ -0,0 +1,57 @@
+import random
+import pytest
+import sectordex_lib as lib
+from sector_helpers import make_planet, make_sector, make_system
+
+
+@pytest.fixture(scope='module')
+def sector():
+    # systems at distances 0-29 from the center with 0-5 planets, so that bounds land exactly on some of them
+    systems = [make_system(f's{system_index}', (float(system_index % 30), 0.0), [()]*(system_index % 6)) for system_index in range(300)]
+    return make_sector(systems)
+
+def get_search_results(sector, expression):
+    expression_req = lib.ExpressionReq(expression)
+    return [sector.get_matching_systems(expression_req, **search_options) for search_options in
+            ({}, {'vectorized': True}, {'indexed': True}, {'vectorized': True, 'indexed': True})]
+
+@pytest.mark.parametrize('expression', [
+    'dist < 10', 'dist <= 10', 'dist < 10.5', 'dist > 20', 'dist >= 20',
+    'planets > 2', 'planets >= 2', 'planets > 2.5', 'planets >= 2.5', 'planets < 3', 'planets <= 2.5',
+    'dist < 10 and planets > 2.5', 'dist <= 9.5 and planets > 3 and uninhabited'
+])
+def test_indexed_search_matches_check(sector, expression):
+    check_result, *other_results = get_search_results(sector, expression)
+    assert check_result
+    for result in other_results:
+        assert result == check_result
+
+def test_strict_bounds_leave_out_the_bound(sector):
+    assert all(system.dist < 10 for system in get_search_results(sector, 'dist < 10')[2])
+    assert all(len(system.planets) > 2.5 for system in get_search_results(sector, 'planets > 2.5')[2])
+
+def test_random_bounds(sector):
+    rnd = random.Random(0)
+    for _ in range(50):
+        dist_op, planets_op = rnd.choice(['<', '<=', '>', '>=']), rnd.choice(['<', '<=', '>', '>='])
+        expression = f'dist {dist_op} {rnd.choice([10, 10.5, 0.25])} or planets {planets_op} {rnd.choice([2, 2.5, 0])}'
+        check_result, *other_results = get_search_results(sector, f'({expression}) and planets {planets_op} {rnd.choice([1, 1.5])}')
+        for result in other_results:
+            assert result == check_result
+
+def test_resource_level_ids_match_like_comparisons():
+    resource_sector = make_sector([make_system('a', (0.0, 0.0), [('ore_rich',)]), make_system('b', (1.0, 0.0), [('ore_sparse',), ('rare_ore_rich',)]),
+                                   make_system('c', (2.0, 0.0), [()])])
+    assert lib.ExpressionReq('ore_rich').tree == lib.ExpressionReq('ore = rich').tree
+    for result in get_search_results(resource_sector, 'ore_rich'):
+        assert [system.id for system in result] == ['a']
+    for result in get_search_results(resource_sector, 'ore_sparse or rare_ore_rich'):
+        assert [system.id for system in result] == ['b']
+
+def test_hyphenated_ids(monkeypatch):
+    monkeypatch.setitem(lib.TYPE_ID_TO_NAME_MAP, 'barren-bombarded', 'Barren Bombarded')
+    systems = [lib.StarSystem(f's{type_index}', f's{type_index}', (float(type_index), 0.0), themes=[], planet_list=[make_planet(f'p{type_index}', f's{type_index}', type_id=type_id)], stations=[])
+               for type_index, type_id in enumerate(['barren', 'barren-bombarded'])]
+    type_sector = make_sector(systems)
+    for result in get_search_results(type_sector, 'type = barren-bombarded and dist <= 5'):
+        assert [system.id for system in result] == ['s1']
@@ -0,0 +1,64 @@
+import bz2
+import gzip
+import lzma
+import os
+import zipfile
+import pytest
+import sectordex_lib as lib
+from save_helpers import get_sector_dump, make_save
+
+
+COMPRESSORS = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+@pytest.fixture(scope='module')
+def save_path(tmp_path_factory):
+    # the catalogs and snapshots get cached next to the save instead of in the home folder
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(lib, 'CATALOG_CACHE_DIR', str(tmp_path_factory.mktemp('catalogs')))
+        monkeypatch.setattr(lib, 'SNAPSHOT_DIR', str(tmp_path_factory.mktemp('snapshots')))
+        yield make_save(str(tmp_path_factory.mktemp('install')))
+
+@pytest.fixture(scope='module')
+def plain_dump(save_path):
+    return load_dump(save_path)
+
+def load_dump(path, **load_options):
+    sector = lib.Sector()
+    sector.load_from_xml(path, **load_options)
+    return get_sector_dump(sector)
+
+def test_plain_loader_finds_every_system(plain_dump):
+    assert len(plain_dump[2]) == 150
+    assert plain_dump[:2] == ('Commander', 'CSEED-1')
+
+@pytest.mark.parametrize('load_options', [{'streaming': True}, {'workers': 2}, {'streaming': True, 'workers': 2}])
+def test_streaming_and_parallel_loading_match_plain_loading(save_path, plain_dump, load_options):
+    assert load_dump(save_path, **load_options) == plain_dump
+
+def write_compressed_copy(save_path, compression):
+    with open(save_path, 'rb') as f:
+        xml_bytes = f.read()
+    if compression == 'zip':
+        # a zipped save folder sits next to the other save folders
+        zip_path = os.path.dirname(save_path) + '.zip'
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('save/campaign.xml', xml_bytes)
+        return zip_path
+    compressed_path = f'{save_path}.{compression}'
+    with COMPRESSORS[compression](compressed_path, 'wb') as f:
+        f.write(xml_bytes)
+    return compressed_path
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('compression', ['gz', 'bz2', 'xz', 'zip'])
+def test_compressed_saves_load_like_plain_ones(save_path, plain_dump, compression, streaming):
+    assert load_dump(write_compressed_copy(save_path, compression), streaming=streaming) == plain_dump
+
+def test_snapshots_restore_the_shared_instances(save_path, plain_dump):
+    load_dump(save_path, use_snapshot=True)
+    sector = lib.Sector()
+    sector.load_from_xml(save_path, use_snapshot=True)
+    assert get_sector_dump(sector) == plain_dump
+    planets = [planet for system in sector.systems for planet in system.planets]
+    assert all([lib.CONDITION_REGISTRY[cond.id] is cond for planet in planets for cond in planet.conditions + planet.resources])
+    assert all([lib.TYPE_REGISTRY[planet.type.id] is planet.type for planet in planets])
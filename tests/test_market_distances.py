@@ -0,0 +1,46 @@
+import random
+from math import dist, inf
+import pytest
+import sectordex_lib as lib
+from sector_helpers import FACTION_IDS, make_random_sector
+
+
+@pytest.fixture(scope='module')
+def sector():
+    return make_random_sector(random.Random(1), 600)
+
+def get_nearest_market_dist(sector, system, faction_id, min_size):
+    market_dists = [dist(system.loc, market_system.loc) for market_system in sector.systems for planet in market_system.planets
+                    if planet.population is not None and (faction_id is None or planet.population.faction_id == faction_id)
+                    and (min_size is None or planet.population.size >= min_size)]
+    return min(market_dists, default=inf)
+
+@pytest.mark.parametrize('faction_id', [None] + FACTION_IDS + ['nobody'])
+@pytest.mark.parametrize('min_size', [None, 3, 5, 7, 8])
+def test_market_distances_match_brute_force(sector, faction_id, min_size):
+    dists = sector.market_distances.get_dists(faction_id, min_size)
+    for system_index, system in enumerate(sector.systems):
+        assert dists[system_index] == pytest.approx(get_nearest_market_dist(sector, system, faction_id, min_size))
+
+def test_market_distance_reqs_match_brute_force(sector):
+    rnd = random.Random(2)
+    for _ in range(50):
+        faction_id, min_size = rnd.choice([None] + FACTION_IDS), rnd.choice([None, 4, 6])
+        min_distance, max_distance = rnd.choice([None, 3, 5.5, 10]), rnd.choice([None, 8, 15, 30])
+        system_req = lib.StarSystemReq(market_distance_reqs=[sector.get_market_distance_req(faction_id, min_size, min_distance, max_distance)])
+        expected = [system for system in sector.systems
+                    if (min_distance is None or get_nearest_market_dist(sector, system, faction_id, min_size) >= min_distance)
+                    and (max_distance is None or get_nearest_market_dist(sector, system, faction_id, min_size) <= max_distance)]
+        for search_options in ({}, {'vectorized': True}, {'indexed': True}):
+            assert sector.get_matching_systems(system_req, **search_options) == expected
+
+def test_market_distance_reqs_work_on_a_query_pool(sector, monkeypatch):
+    monkeypatch.setattr(lib, 'PARALLEL_QUERY_MIN_SYSTEMS', 0)
+    rnd = random.Random(3)
+    try:
+        for _ in range(20):
+            market_distance_req = sector.get_market_distance_req(rnd.choice([None] + FACTION_IDS), rnd.choice([None, 4, 6]), rnd.choice([None, 5]), rnd.choice([None, 15, 30]))
+            system_req = lib.StarSystemReq(market_distance_reqs=[market_distance_req])
+            assert sector.get_matching_systems(system_req, workers=2) == sector.get_matching_systems(system_req)
+    finally:
+        sector.close_query_pool()
@@ -0,0 +1,60 @@
+import random
+import pytest
+import sectordex_lib as lib
+from sector_helpers import make_random_planet_req, make_random_sector, make_random_system_req
+
+
+@pytest.fixture(scope='module')
+def sector():
+    return make_random_sector(random.Random(1))
+
+def get_ids(systems):
+    return [system.id for system in systems]
+
+def test_tighter_planet_reqs_match_fewer_planets(sector):
+    rnd = random.Random(2)
+    planets = [planet for system in sector.systems for planet in system.planets]
+    planet_reqs = [make_random_planet_req(rnd) for _ in range(150)]
+    matches = [{planet.id for planet in planets if planet_req.check(planet)} for planet_req in planet_reqs]
+    tighter_num = 0
+    for req_index, planet_req in enumerate(planet_reqs):
+        for other_index, other_planet_req in enumerate(planet_reqs):
+            if lib.is_tighter_planet_req(planet_req.get_cache_key(), other_planet_req.get_cache_key()):
+                tighter_num += 1
+                assert matches[req_index] <= matches[other_index], (planet_req, other_planet_req)
+    # not just the reqs themselves
+    assert tighter_num > 2*len(planet_reqs)
+
+def test_tighter_system_reqs_match_fewer_systems(sector):
+    rnd = random.Random(3)
+    planet_req_pool = [make_random_planet_req(rnd) for _ in range(8)]
+    system_reqs = [make_random_system_req(rnd, sector, planet_req_pool) for _ in range(250)]
+    matches = [set(get_ids(sector.get_matching_systems(system_req))) for system_req in system_reqs]
+    tighter_num = 0
+    for req_index, system_req in enumerate(system_reqs):
+        for other_index, other_system_req in enumerate(system_reqs):
+            if req_index != other_index and lib.is_tighter_system_req(system_req.get_cache_key(), other_system_req.get_cache_key()):
+                tighter_num += 1
+                assert matches[req_index] <= matches[other_index], (system_req.get_cache_key(), other_system_req.get_cache_key())
+    assert tighter_num > 100
+
+@pytest.mark.parametrize('search_options', [{}, {'vectorized': True}, {'indexed': True}, {'vectorized': True, 'indexed': True}])
+def test_cached_searches_match_uncached_ones(sector, search_options):
+    rnd = random.Random(4)
+    planet_req_pool = [make_random_planet_req(rnd) for _ in range(8)]
+    sector.query_cache = lib.QueryCache()
+    refined_num = 0
+    for _ in range(400):
+        # loose searches now and then, which later ones get narrowed down from
+        system_req = make_random_system_req(rnd, sector, planet_req_pool) if rnd.random() < 0.8 else lib.StarSystemReq(max_distance=rnd.choice([None, 45]))
+        cache_key = system_req.get_cache_key()
+        if sector.query_cache.get(cache_key) is None and sector.query_cache.get_looser(cache_key) is not None:
+            refined_num += 1
+        assert get_ids(sector.get_matching_systems(system_req, cached=True, **search_options)) == get_ids(sector.get_matching_systems(system_req))
+    assert refined_num > 50
+
+def test_cached_results_are_copies(sector):
+    sector.query_cache = lib.QueryCache()
+    system_req = lib.StarSystemReq(max_distance=20)
+    sector.get_matching_systems(system_req, cached=True).clear()
+    assert sector.get_matching_systems(system_req, cached=True) == sector.get_matching_systems(system_req)
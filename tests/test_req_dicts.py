@@ -0,0 +1,11 @@
+import pytest
+import sectordex_lib as lib
+
+
+def test_resources_under_conditions_are_rejected():
+    with pytest.raises(ValueError, match='ore_rich'):
+        lib.get_planet_req_from_dict({'conditions': ['ore_rich']})
+
+def test_resources_give_minimum_levels():
+    planet_req = lib.get_planet_req_from_dict({'resources': ['ore_rich']})
+    assert [level.id for level in planet_req.desired_resources] == ['ore_rich']
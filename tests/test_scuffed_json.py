@@ -0,0 +1,25 @@
+import time
+import pytest
+import sectordex_lib as lib
+
+
+def test_relaxed_json():
+    json_str = '''{
+        # hash comment
+        id: hegemony, // line comment
+        /* block
+           comment */ "displayName": "Hegemony",
+        "tags": [a, "b", 3, 4.5, true, null,],
+    }'''
+    assert lib.load_scuffed_json(json_str) == {'id': 'hegemony', 'displayName': 'Hegemony', 'tags': ['a', 'b', 3, 4.5, True, None]}
+
+def test_comments_are_not_split_up():
+    assert lib.load_scuffed_json('{a: 1 # b # c\n}') == {'a': 1}
+    assert lib.load_scuffed_json('{a: /* x **/ 1 /* y */}') == {'a': 1}
+
+@pytest.mark.parametrize('padding', [' '*5000, '\n\t '*2000, '# comment\n'*2000, '/* x */'*2000, '// a # b /* c\n'*2000])
+def test_malformed_json_after_long_whitespace_fails_fast(padding):
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        lib.load_scuffed_json('{"id":' + padding + '"unterminated')
+    assert time.perf_counter() - start < 1
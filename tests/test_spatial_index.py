@@ -0,0 +1,41 @@
+import random
+import numpy as np
+import pytest
+import sectordex_lib as lib
+
+
+def get_random_locs(rnd, loc_num):
+    # half ly grid with duplicates, so that distances often land right on the radius
+    return [(rnd.randint(-80, 80)/2, rnd.randint(-80, 80)/2) for _ in range(loc_num)]
+
+def get_linear_within_radius(locs, loc, radius):
+    return [loc_index for loc_index, other_loc in enumerate(locs) if (other_loc[0] - loc[0])**2 + (other_loc[1] - loc[1])**2 <= radius*radius]
+
+@pytest.mark.parametrize('locs', [
+    get_random_locs(random.Random(1), 500),
+    get_random_locs(random.Random(2), 3),
+    [(float(x), 0.0) for x in range(50)],
+    [(0.0, float(y)) for y in range(50)],
+    [(1.0, 1.0)]*10,
+    [],
+])
+def test_radius_search_matches_linear_scan(locs):
+    rnd = random.Random(3)
+    spatial_index = lib.SpatialIndex(locs)
+    for _ in range(300):
+        loc = (rnd.randint(-100, 100)/2, rnd.randint(-100, 100)/2) if rnd.random() < 0.5 or not locs else rnd.choice(locs)
+        radius = rnd.choice([0, 0.5, 1, 2.5, 5, 10, 30, 200])
+        assert spatial_index.get_within_radius(loc, radius).tolist() == get_linear_within_radius(locs, loc, radius)
+
+def test_nearest_search_matches_sorting():
+    rnd = random.Random(4)
+    locs = get_random_locs(rnd, 400)
+    spatial_index = lib.SpatialIndex(locs)
+    squared_dists = lambda loc: [(other_loc[0] - loc[0])**2 + (other_loc[1] - loc[1])**2 for other_loc in locs]
+    for _ in range(200):
+        loc = rnd.choice(locs) if rnd.random() < 0.5 else (rnd.uniform(-60, 60), rnd.uniform(-60, 60))
+        k = rnd.choice([1, 3, 10, 50, 500])
+        excluded_index = rnd.choice([None, rnd.randrange(len(locs))])
+        nearest = spatial_index.get_nearest(loc, k, excluded_index)
+        expected = [loc_index for loc_index in np.argsort(squared_dists(loc), kind='stable') if loc_index != excluded_index][:k]
+        assert nearest.tolist() == expected